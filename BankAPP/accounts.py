@@ -1,73 +1,190 @@
 from datetime import datetime, date
+from collections import Counter
+from functools import lru_cache
+from bisect import bisect_left
 import decimal
 from exceptions import TransactionLimitError, TransactionSequenceError, OverdrawError
-from transaction import Transaction
+from ledger import Ledger, INTEREST, FEE
+from money import Money, rate_ratio
+from statements import MonthlyStatement, months
 
 
 
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    "Parses a YYYY-MM-DD string; recently seen dates are served from a cache"
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def last_day_of_month(year, month):
+    "Returns the date interest and fees are posted on for the given month"
+    if month in [1, 3, 5, 7, 8, 10, 12]:
+        return date(year, month, 31)
+    elif month == 2:
+        return date(year, month, 28)
+    return date(year, month, 30)
+
+
 class Accounts:
-    decimal.setcontext(decimal.Context(rounding = decimal.ROUND_HALF_UP))
     last_id = 1
+    interest_rate = decimal.Decimal('0')
+    interest_ratio = rate_ratio(interest_rate)  # interest_rate as Money.times_ratio takes it
+    balance_threshold = None  # accounts below this balance at month end are charged low_balance_fee
+    low_balance_fee = None
+    _listener = None  # called with every recorded posting, e.g. by a Journal
     
     def __init__(self, transactions = None, balance = 0):
         """Initialize an account with no transactions and 0 balance."""
 
-        self.balance = decimal.Decimal('0.00')
-        self._transactions = []
+        self.balance = Money(0)
+        self._transactions = Ledger()
         self._id = Accounts.last_id
+        self._number = Accounts.last_id
+        self._reset_index()
 
         Accounts.last_id += 1
 
+    def _reset_index(self):
+        "Clears the lookup state kept alongside the transaction history"
+        self._latest_date = None
+        self._interest_months = set()
+        self._fee_months = set()
+        self._day_counts = Counter()
+        self._month_counts = Counter()
+        self._statements = {}  # (year, month) -> MonthlyStatement, for months with postings
+        self._statement_months = []  # keys of _statements in order
+
+    def _rebuild_index(self):
+        "Recomputes the lookup state from the stored transactions"
+        self._reset_index()
+        for ordinal, cents, flags in self._transactions.rows():
+            self._index_transaction(date.fromordinal(ordinal), cents, flags & INTEREST, flags & FEE)
+
+    def _index_transaction(self, transaction_date, cents, is_interest=False, is_fee=False):
+        "Records a new transaction in the latest date, interest/fee month, limit count and monthly statement lookups"
+        month_key = (transaction_date.year, transaction_date.month)
+        if self._latest_date is None or transaction_date > self._latest_date:
+            self._latest_date = transaction_date
+        statement = self._statements.get(month_key)
+        if statement is None:
+            # postings are in date order, so a new month follows on from the latest one
+            previous = self._statements[self._statement_months[-1]] if self._statement_months else None
+            statement = previous.carried(*month_key) if previous is not None else MonthlyStatement(*month_key)
+            self._statements[month_key] = statement
+            self._statement_months.append(month_key)
+        statement.add(cents, is_interest, is_fee)
+        if is_interest:
+            self._interest_months.add(month_key)
+        elif is_fee:
+            self._fee_months.add(month_key)
+        else:
+            # only ordinary postings count toward the savings limits
+            self._day_counts[transaction_date] += 1
+            self._month_counts[month_key] += 1
+
+    def __getattr__(self, name):
+        """Materializes the transactions of an account loaded from a snapshot the first time they are needed"""
+        segment = self.__dict__.pop("_segment", None)
+        if segment is None:
+            raise AttributeError(name)
+        reader, offset, rows = segment
+        self._transactions = Ledger.from_bytes(reader.buffer, offset, rows)
+        self._rebuild_index()
+        return getattr(self, name)
+
+    def __getstate__(self):
+        "Pickles the account without its posting listener"
+        self._transactions  # materializes lazily loaded accounts
+        state = self.__dict__.copy()
+        state.pop("_listener", None)
+        return state
+
+    def __setstate__(self, state):
+        "Restores a pickled account and rebuilds its lookups from the stored transactions"
+        self.__dict__.update(state)
+        if "_number" not in state:
+            self._number = int(self._id.split("#")[1])
+        if isinstance(self._transactions, list):
+            self._transactions = Ledger.from_transactions(self._transactions)
+        if not isinstance(self.balance, Money):
+            self.balance = Money.of(self.balance)  # saved as a Decimal by older versions
+        self._rebuild_index()
+
     def add_transaction(self, amount, date, is_interest=False, is_fees=False):
         """Method to add transaction to an account"""
 
-        transaction_date = datetime.strptime(date, "%Y-%m-%d").date()
-        
-        if is_interest:
-            for transaction in self._transactions:
-                existing_transaction_date = datetime.strptime(transaction._date, "%Y-%m-%d").date()
-                if (existing_transaction_date.month == transaction_date.month and existing_transaction_date.year == transaction_date.year and transaction.is_interest):
-                    raise TransactionSequenceError(transaction_date.strftime('%B'))
-        elif is_fees:
-            for transaction in self._transactions:
-                existing_transaction_date = datetime.strptime(transaction._date, "%Y-%m-%d").date()
-                if (existing_transaction_date.month == transaction_date.month and existing_transaction_date.year == transaction_date.year and transaction.is_fee):
-                    raise TransactionSequenceError(transaction_date.strftime('%B'))
-            
-        if self._transactions:
-            latest_transaction = max(datetime.strptime(transaction._date, "%Y-%m-%d").date() for transaction in self._transactions)
-
-            if transaction_date < latest_transaction:
-                raise TransactionSequenceError(latest_transaction)
+        transaction_date = parse_date(date)
+        self._post(Money.of(amount), transaction_date, is_interest, is_fees)
+
+    def month_end_posted(self, year, month, is_fee=False):
+        """Returns whether interest (or, with is_fee, the low balance fee) was already posted in the month.
+
+        This is the one once-per-month check for interest and fees, whether they are posted by
+        interest_and_fees or by Bank.run_month_end, and it is answered from the flagged postings.
+        """
+        return (year, month) in (self._fee_months if is_fee else self._interest_months)
+
+    def _post(self, amount, transaction_date, is_interest=False, is_fees=False):
+        """Checks the sequence and once-per-month rules for a parsed date and records the transaction of a Money amount"""
+        if (is_interest or is_fees) and self.month_end_posted(transaction_date.year, transaction_date.month, is_fees):
+            raise TransactionSequenceError(transaction_date.strftime('%B'))
+
+        if self._latest_date is not None and transaction_date < self._latest_date:
+            raise TransactionSequenceError(self._latest_date)
 
         self.set_balance(amount)
-        self._add_transaction_history(date, amount, is_interest)
+        cents = self._add_transaction_history(transaction_date, amount, is_interest, is_fees)
+        self._index_transaction(transaction_date, cents, is_interest, is_fees)
+        if self._listener is not None:
+            self._listener(self, amount, transaction_date, is_interest, is_fees)
    
 
     def interest_and_fees(self, interest):
         """Method to apply interest and fees to an account by choosing the last day of the month of the last transaction date"""
     
-        sorted_transactions = sorted(self._transactions, key = lambda t: (t._date, self._transactions.index(t)))
-
-        if sorted_transactions:
-            last_transaction_date = sorted_transactions[-1]
-            last_transaction_date_str = last_transaction_date._date
-            last_transaction_date = datetime.strptime(last_transaction_date_str, "%Y-%m-%d").date()
+        if self._latest_date is not None:
+            last_transaction_date = self._latest_date
             last_transaction_year = last_transaction_date.year
             last_transaction_month = last_transaction_date.month
         
-
-        if last_transaction_month in [1, 3, 5, 7, 8, 10, 12]:
-            transaction_date = date(last_transaction_year, last_transaction_month, 31)
-        elif last_transaction_month == 2:
-            transaction_date = date(last_transaction_year, last_transaction_month, 28)
-        else:
-            transaction_date = date(last_transaction_year, last_transaction_month, 30)
+        transaction_date = last_day_of_month(last_transaction_year, last_transaction_month)
 
 
         self.add_transaction(interest, str(transaction_date), True, False)
 
         
+    def iter_transactions(self, start=None, end=None, offset=0, limit=None):
+        "Yields the transactions dated from start to end in date order, one page at a time when offset/limit are given"
+        return self._transactions.iter_range(start, end, offset, limit)
+
+    def balance_as_of(self, as_of):
+        "Returns the balance after every posting dated on or before as_of (a date or YYYY-MM-DD string)"
+        if isinstance(as_of, str):
+            as_of = parse_date(as_of)
+        return Money(self._transactions.balance_as_of(as_of.toordinal()))
+
+    def get_statement(self, year, month):
+        "Returns the MonthlyStatement of the account for one month"
+        first = date(year, month, 1)
+        return self.get_statements(first, first)[0]
+
+    def get_statements(self, start, end):
+        """Returns one MonthlyStatement per month from the month of start to the month of end, in order.
+
+        Statements come from the monthly totals kept as postings are recorded, without reading the
+        transactions. Months without postings get a statement carrying the balance.
+        """
+        statements = []
+        index = bisect_left(self._statement_months, (start.year, start.month))
+        current = self._statements[self._statement_months[index - 1]] if index else None
+        for month_key in months(start, end):
+            statement = self._statements.get(month_key)
+            if statement is None:
+                statement = current.carried(*month_key) if current is not None else MonthlyStatement(*month_key)
+            current = statement
+            statements.append(statement)
+        return statements
+
     def get_latest_transaction(self):
         return self._transactions[-1]
         
@@ -75,10 +192,18 @@ class Accounts:
     def get_id(self):
         "Method returns id because its a private var"
         return self._id
+
+    def get_number(self):
+        "Returns the numeric part of the account id, as entered when selecting an account"
+        return self._number
+
+    def get_type(self):
+        "Returns 'checking' or 'savings'"
+        return self._id.split("#")[0].lower()
     
     def set_balance(self, amount):
-        "Adds/subtracts amount from the account balance"
-        self.balance += decimal.Decimal(amount)
+        "Adds/subtracts a Money amount from the account balance"
+        self.balance += amount
     
     def id_matches(self, account_id):
         "This method returns true if the provided ID matches the id of the account"
@@ -86,51 +211,34 @@ class Accounts:
             return True
         return False
     
-    def _add_transaction_history(self, date, amount, is_interest=False):
-        "Keeps track of the transaction history of an account"
-        formatted_amount = f"${amount:,.2f}"
-        _transaction = Transaction(date, formatted_amount, is_interest=is_interest)
-
-        self._transactions.append(_transaction)
+    def _add_transaction_history(self, transaction_date, amount, is_interest=False, is_fee=False):
+        "Keeps track of the transaction history of an account, and returns the cents of the Money amount"
+        cents = amount.cents
+        self._transactions.append(transaction_date, cents, is_interest, is_fee)
+        return cents
 
         
 
 
 class CheckingAccount(Accounts):
     """Creating a Checking Account"""
+    interest_rate = decimal.Decimal('0.0008')
+    interest_ratio = rate_ratio(interest_rate)
+    balance_threshold = Money.of(100)
+    low_balance_fee = Money.parse('-5.44')
 
     def __init__(self, transactions=None, balance=0):
         super().__init__(transactions, balance)
         self._id = f"Checking#{self._id:09d}"
-        self.interest_applied = False  # Flag to track whether interest has been applied
-        self.fees_applied = False  # Flag to track whether fees have been applied
-        self._last_interest_month = None  # Track the month when interest was last applied
-        self._last_fees_month = None
 
     def add_transaction(self, amount, date, is_interest=False, is_fees=False):
         """Method to add transaction to a Checking Account, while checking if it's an interest or normal transaction"""
 
-        if not is_interest and amount < (-1 * self.balance):
+        amount = Money.of(amount)
+        if not is_interest and amount.cents < -self.balance.cents:
             raise OverdrawError
 
-        # Reset interest and fees flags if a normal transaction is added
-        if not is_interest and not is_fees:
-            self.interest_applied = False
-            self.fees_applied = False
-
-        if is_interest:
-            # Check if interest has already been applied for the current month
-            if self.interest_applied:
-                raise TransactionSequenceError(date)  
-            self.interest_applied = True
-
-        if is_fees:
-            # Check if fees have already been applied for the current month
-            if self.fees_applied:
-                raise TransactionSequenceError(date)  
-            self.fees_applied = True
-
-        super().add_transaction(amount, date)
+        super().add_transaction(amount, date, is_interest, is_fees)
 
 
     def set_balance(self, amount):
@@ -138,98 +246,47 @@ class CheckingAccount(Accounts):
         super().set_balance(amount)
 
     def interest_and_fees(self):
-        """Applies interest and fees to the checking account"""
-
-        current_month = date.today().month
-
-        # Check if we've entered a new month since last applying interest
-        if self._last_interest_month != current_month:
-            
-            self.interest_applied = False
-        if self._last_fees_month != current_month:
-            
-            self.fees_applied = False
-
-        # Now that the flags are reset, attempt to apply the interest
-        try:
-            super().interest_and_fees(self.balance * decimal.Decimal('0.0008'))
-            self._last_interest_month = current_month
-        except TransactionSequenceError as e:
-            latest_date_str = e.latest_date  
-            latest_date = datetime.strptime(latest_date_str, "%Y-%m-%d").date()  
-            latest_month = latest_date.strftime('%B') 
-           
-            raise TransactionSequenceError(f"{latest_month}")
-        
-        # Logic for fees if balance < 100
-        sorted_transactions = sorted(self._transactions, key=lambda t: (t._date, self._transactions.index(t)))
-        if sorted_transactions:
-            last_transaction_date = sorted_transactions[-1]
-            last_transaction_date_str = last_transaction_date._date
-            last_transaction_date = datetime.strptime(last_transaction_date_str, "%Y-%m-%d").date()
-            if last_transaction_date.month in [1, 3, 5, 7, 8, 10, 12]:
-                transaction_date = date(last_transaction_date.year, last_transaction_date.month, 31)
-            elif last_transaction_date.month == 2:
-                transaction_date = date(last_transaction_date.year, last_transaction_date.month, 28)
-            else:
-                transaction_date = date(last_transaction_date.year, last_transaction_date.month, 30)
-
-            
-    
-        if self.balance < 100:
-            try:
-                self.add_transaction(decimal.Decimal('-5.44'), str(transaction_date), False, True)
-                # After successfully applying fees, update the respective month
-                self._last_fees_month = current_month
-            except TransactionSequenceError:
-                latest_date_str = e.latest_date
-                latest_date = datetime.strptime(latest_date_str, "%Y-%m-%d").date()
-                latest_month = latest_date.strftime('%B')
-                
-                raise TransactionSequenceError(f"{latest_month}")
-
-       
-
-
+        """Applies interest, and the low balance fee if the balance is then below the threshold, to the checking account.
+        Raises TransactionSequenceError with the month if interest was already applied in it."""
 
+        super().interest_and_fees(self.balance.times_ratio(self.interest_ratio))
+        if self.balance < self.balance_threshold:
+            self.add_transaction(self.low_balance_fee, str(self._latest_date), False, True)
 
 
 
 
 class SavingsAccount(Accounts):
     """Create a savings account"""
+    interest_rate = decimal.Decimal('0.0041')
+    interest_ratio = rate_ratio(interest_rate)
+
     def __init__(self, transactions=None, balance=0):
         super().__init__(transactions, balance)
         self._id = f"Savings#{self._id:09d}" 
 
     def interest_and_fees(self):
         """Apply interest and fees to Savings Account"""
-        super().interest_and_fees(self.balance * decimal.Decimal('0.0041'))
+        super().interest_and_fees(self.balance.times_ratio(self.interest_ratio))
 
     def add_transaction(self, amount, date, is_interest=False, is_fees = False):
         """Adds transaction to a Savings Account, while checking if its an interest or normal transaction.
         It also checks whether the daily or monthly limit has exceeded"""
 
-        if not is_interest and amount < (-1 * self.balance):
+        amount = Money.of(amount)
+        if not is_interest and amount.cents < -self.balance.cents:
             raise OverdrawError
 
         if is_interest:
             super().add_transaction(amount, date, is_interest, is_fees=False)
             return
         
-        months, days = 0, 0
-        if len(self._transactions) >= 2:
-            for each in self._transactions:
-                if not(each.is_interest):
-                    if each._date[5:7] == date[5:7] and each._date[0:4] == date[0:4]:
-                        months += 1
-                        if each._date[8:10] == date[8:10]:
-                            days += 1
-                if months >= 5:
-                    raise TransactionLimitError("monthly")
-                if days >= 2:
-                    raise TransactionLimitError("daily")
-        super().add_transaction(amount, date)
+        transaction_date = parse_date(date)
+        if self._month_counts[(transaction_date.year, transaction_date.month)] >= 5:
+            raise TransactionLimitError("monthly")
+        if self._day_counts[transaction_date] >= 2:
+            raise TransactionLimitError("daily")
+        self._post(amount, transaction_date)
 
     
     def set_balance(self, amount):
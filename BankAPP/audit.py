@@ -0,0 +1,247 @@
+"""Replays every account's ledger and reports where the stored balance or the history breaks the bank's rules.
+
+    python audit.py [--workers 4] [--partition-size 1000] [--checkpoint audit.checkpoint] [--report audit.jsonl]
+                    [--legacy-flags]
+
+The bank is read from bank.snapshot and bank.journal (or bank.pickle) as the CLI loads it, but without
+attaching the journal, so the audit writes nothing to them and can run while the bank is in use. Accounts
+are split into partitions of consecutive accounts and each partition's ledgers are replayed by a
+worker process, so the audit scales with the number of cores. Ledgers still in the mapped snapshot
+are handed to the workers as their raw segment without being loaded first. For every account it checks:
+
+    balance        the balance equals the sum of the ledger
+    sequence       every posting is dated on or after the one recorded before it
+    overdraft      no withdrawal or fee was larger than the balance before it
+    daily_limit    no savings account has more than SAVINGS_DAILY_LIMIT postings in a day
+    monthly_limit  no savings account has more than SAVINGS_MONTHLY_LIMIT postings in a month
+    month_end      each month has at most one interest and one fee posting, dated on its last day
+
+Interest and fee postings are told apart by their ledger flags. Interest postings are only subject
+to the sequence and month_end checks, and fees also to the overdraft check.
+
+Checking accounts used to record their interest and fees without flags. With --legacy-flags, an
+unflagged checking posting dated on the last day of a month is taken to be the fee or the interest
+when its amount is the low balance fee or the interest on the balance before it. Only use it on a
+bank with postings from before the flags were kept: it also takes an ordinary posting of that amount
+on that day for interest or a fee, exempting it from the other checks.
+
+Every finished partition is saved to the checkpoint file; rerunning with the same checkpoint skips
+those partitions, so an interrupted audit carries on where it stopped. The checkpoint is removed
+once the audit is complete. Exits with status 1 when there are discrepancies.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import logconfig
+from datetime import date
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from accounts import CheckingAccount, last_day_of_month
+from ledger import Ledger, INTEREST, FEE
+from journal import Journal
+from money import Money
+from snapshot import ROW_SIZE
+
+DEFAULT_PARTITION_SIZE = 1000
+DEFAULT_CHECKPOINT = "audit.checkpoint"
+# as enforced by SavingsAccount.add_transaction
+SAVINGS_DAILY_LIMIT = 2
+SAVINGS_MONTHLY_LIMIT = 5
+
+
+def _dollars(cents):
+    return f"-${Money(-cents):,.2f}" if cents < 0 else f"${Money(cents):,.2f}"
+
+
+def _legacy_kind(posted, cents, balance_cents):
+    """Returns INTEREST or FEE if an unflagged checking posting looks like the month's interest or low balance fee, else 0
+
+    Args:
+        posted (date): date of the posting
+        cents (int): amount of the posting
+        balance_cents (int): balance before the posting
+    """
+    if posted.day < 28 or posted != last_day_of_month(posted.year, posted.month):
+        return 0
+    if cents == CheckingAccount.low_balance_fee.cents:
+        return FEE
+    if cents == Money(balance_cents).times_ratio(CheckingAccount.interest_ratio).cents:
+        return INTEREST
+    return 0
+
+
+def audit_account(account_id, account_type, balance, ledger, legacy_flags=False):
+    """Replays one account's ledger against its stored balance and the rules
+
+    Args:
+        account_id (str): id of the account, e.g. Savings#000000001
+        account_type (str): "checking" or "savings"
+        balance (Money): the account's stored balance
+        ledger (Ledger): the account's postings in the order they were recorded
+        legacy_flags (bool, optional): recognise unflagged checking interest and fees. Defaults to False.
+
+    Returns:
+        list: one dict per discrepancy, with the account, check, date (or None) and detail
+    """
+    discrepancies = []
+
+    def report(check, day, detail):
+        discrepancies.append({"account": account_id, "check": check, "date": day, "detail": detail})
+
+    legacy_flags = legacy_flags and account_type == "checking"
+    total = 0
+    latest = 0
+    day_counts, month_counts, interest_months, fee_months = Counter(), Counter(), set(), set()
+    for ordinal, cents, flags in ledger.rows():
+        posted = date.fromordinal(ordinal)
+        day, month = posted.isoformat(), posted.isoformat()[:7]
+        if ordinal < latest:
+            report("sequence", day, f"posted after a transaction dated {date.fromordinal(latest)}")
+        kind = flags & (INTEREST | FEE)
+        if not kind and legacy_flags:
+            kind = _legacy_kind(posted, cents, total)
+        if kind:
+            postings = interest_months if kind & INTEREST else fee_months
+            if month in postings:
+                report("month_end", day, f"second {'interest' if kind & INTEREST else 'fee'} posting in {month}")
+            postings.add(month)
+            if posted != last_day_of_month(posted.year, posted.month):
+                report("month_end", day, "interest or fee not posted on the last day of the month")
+        if not kind & INTEREST:
+            if cents < 0 and total < -cents:
+                report("overdraft", day, f"withdrawal of {_dollars(-cents)} from a balance of {_dollars(total)}")
+            if account_type == "savings" and not kind:
+                day_counts[ordinal] += 1
+                month_counts[month] += 1
+                if day_counts[ordinal] == SAVINGS_DAILY_LIMIT + 1:
+                    report("daily_limit", day, f"more than {SAVINGS_DAILY_LIMIT} transactions in the day")
+                if month_counts[month] == SAVINGS_MONTHLY_LIMIT + 1:
+                    report("monthly_limit", day, f"more than {SAVINGS_MONTHLY_LIMIT} transactions in {month}")
+        total += cents
+        latest = max(latest, ordinal)
+
+    if balance.cents != total:
+        report("balance", None, f"balance {_dollars(balance.cents)}, ledger sums to {_dollars(total)}")
+    return discrepancies
+
+
+def audit_partition(accounts, legacy_flags=False):
+    """Audits a partition of accounts given as (id, type, balance, rows, ledger bytes)
+
+    Returns:
+        list: the discrepancies found, as audit_account reports them
+    """
+    discrepancies = []
+    for account_id, account_type, balance, rows, data in accounts:
+        ledger = Ledger.from_bytes(data, 0, rows)
+        discrepancies.extend(audit_account(account_id, account_type, Money.parse(balance), ledger, legacy_flags))
+    return discrepancies
+
+
+def _ledger_bytes(account):
+    "Returns an account's ledger as Ledger.to_bytes writes it, copied from the snapshot if it was never loaded"
+    segment = account.__dict__.get("_segment")
+    if segment is not None:
+        reader, offset, rows = segment
+        return rows, reader.buffer[offset:offset + rows * ROW_SIZE]
+    return len(account._transactions), account._transactions.to_bytes()
+
+
+def partitions(bank, size):
+    "Splits the bank's accounts into partitions of at most size, keyed by their first and last account number"
+    result = {}
+    accounts = bank._accounts
+    for i in range(0, len(accounts), size):
+        chunk = accounts[i:i + size]
+        result[f"{chunk[0].get_number()}-{chunk[-1].get_number()}"] = chunk
+    return result
+
+
+def _load_checkpoint(path, source):
+    "Returns the discrepancies of the partitions finished by an earlier run on the same bank, by partition"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != source:
+        logging.debug("Ignoring checkpoint %s of another bank", path)
+        return {}
+    return checkpoint["partitions"]
+
+
+def _save_checkpoint(path, source, finished):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"source": source, "partitions": finished}, f)
+    os.replace(temp_path, path)
+
+
+def run_audit(bank, workers=None, partition_size=DEFAULT_PARTITION_SIZE, checkpoint=DEFAULT_CHECKPOINT,
+              legacy_flags=False):
+    """Audits every account of the bank across a pool of worker processes.
+
+    Args:
+        bank (Bank): the bank to audit
+        workers (int, optional): worker processes. Defaults to the number of CPUs.
+        partition_size (int, optional): accounts per partition. Defaults to DEFAULT_PARTITION_SIZE.
+        checkpoint (str, optional): checkpoint file, or None to neither resume nor save progress
+        legacy_flags (bool, optional): recognise unflagged checking interest and fees. Defaults to False.
+
+    Returns:
+        dict: the discrepancies, and the number of partitions audited and resumed
+    """
+    # a checkpoint only applies to the same state of the bank, audited the same way
+    source = [len(bank._accounts), bank._journal_seq, legacy_flags]
+    chunks = partitions(bank, partition_size)
+    finished = _load_checkpoint(checkpoint, source) if checkpoint else {}
+    resumed = sum(1 for key in chunks if key in finished)
+    pending = [key for key in chunks if key not in finished]
+    if pending:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {}
+            for key in pending:
+                payload = [(account.get_id(), account.get_type(), str(account.balance), *_ledger_bytes(account))
+                           for account in chunks[key]]
+                futures[pool.submit(audit_partition, payload, legacy_flags)] = key
+            for future in as_completed(futures):
+                finished[futures[future]] = future.result()
+                if checkpoint:
+                    _save_checkpoint(checkpoint, source, finished)
+
+    discrepancies = [d for key in chunks for d in finished[key]]
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    logging.debug("Audited %s partitions (%s resumed): %s discrepancies", len(chunks), resumed, len(discrepancies))
+    return {"discrepancies": discrepancies, "partitions": len(chunks), "resumed": resumed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay every account's ledger and report discrepancies")
+    parser.add_argument("--workers", type=int, help="worker processes. Defaults to the number of CPUs")
+    parser.add_argument("--partition-size", type=int, default=DEFAULT_PARTITION_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT,
+                        help="file that progress is saved to and resumed from")
+    parser.add_argument("--report", help="also write the discrepancies to this file as JSON lines")
+    parser.add_argument("--legacy-flags", action="store_true",
+                        help="recognise checking interest and fees recorded without their flags by date and amount")
+    args = parser.parse_args(argv)
+
+    logconfig.configure('bank.log')
+    bank = Journal().read()
+    result = run_audit(bank, args.workers, args.partition_size, args.checkpoint, args.legacy_flags)
+    discrepancies = result["discrepancies"]
+    for d in discrepancies:
+        print(f"{d['account']}: {d['check']}{' on ' + d['date'] if d['date'] else ''}: {d['detail']}")
+    if args.report:
+        with open(args.report, "w") as f:
+            for d in discrepancies:
+                f.write(json.dumps(d) + "\n")
+    resumed = f" ({result['resumed']} resumed from the checkpoint)" if result["resumed"] else ""
+    print(f"{len(discrepancies)} discrepancies in {result['partitions']} partitions{resumed}.")
+    return 1 if discrepancies else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
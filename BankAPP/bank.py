@@ -1,7 +1,5 @@
-from accounts import CheckingAccount, SavingsAccount, Accounts
+from accounts import CheckingAccount, SavingsAccount, Accounts, last_day_of_month
 from transaction import Transaction
-import decimal
-decimal.getcontext().rounding = decimal.ROUND_HALF_UP
 
 class Bank:
     """Container class with information of accounts, transactions, and summary methods"""
@@ -9,6 +7,28 @@ class Bank:
     def __init__(self):
         """Initializes Bank List with an empty list."""
         self._accounts = []
+        self._accounts_by_id = {}
+        self._journal = None
+        self._journal_seq = 0  # last journal record included in this bank's state
+        self._snapshot_reader = None  # mapped snapshot that lazily loaded accounts read from
+
+    def __getstate__(self):
+        """Pickles the bank without its journal or account index"""
+        state = self.__dict__.copy()
+        state.pop("_journal", None)
+        state.pop("_accounts_by_id", None)
+        state.pop("_snapshot_reader", None)
+        return state
+
+    def __setstate__(self, state):
+        """Restores a pickled bank and rebuilds the account id index"""
+        self.__dict__.update(state)
+        self._journal = None
+        self._journal_seq = state.get("_journal_seq", 0)
+        self._snapshot_reader = None
+        self._accounts_by_id = {}
+        for account in self._accounts:
+            self._accounts_by_id.setdefault(account.get_number(), account)
        
     def create_account(self, account_type):
         """Create Account of type savings or checking"""
@@ -17,23 +37,89 @@ class Bank:
         elif account_type == "savings":
             _account = SavingsAccount()
         self._accounts.append(_account)
+        self._accounts_by_id.setdefault(_account.get_number(), _account)
+        if self._journal is not None:
+            self._journal.account_opened(_account)
+        return _account
+
+    def _add_loaded_account(self, account):
+        """Adds an account read from a snapshot"""
+        self._accounts.append(account)
+        self._accounts_by_id.setdefault(account.get_number(), account)
+
+    def _restore_account(self, account_type, number):
+        """Recreates an account with a known number, e.g. while replaying a journal"""
+        Accounts.last_id = number
+        _account = self.create_account(account_type)
+        Accounts.last_id = max(Accounts.last_id, self._next_number())
         return _account
 
+    def _next_number(self):
+        """Returns the number after the highest account number in the bank"""
+        return max(self._accounts_by_id, default=0) + 1
+
     def _find_account(self, account_id):
         """Locate the account with the given id."""
-        for account in self._accounts:
-            if account.id_matches(account_id):
-                return account
-        return None
+        return self._accounts_by_id.get(account_id)
     
-    def list_transactions(self, acc):
-        """Function to sort transactions and print them"""
-        sorted_transactions = sorted(acc._transactions, key = lambda t: (t._date, acc._transactions.index(t))) 
-        for transaction in sorted_transactions:
+    def list_transactions(self, acc, start=None, end=None, offset=0, limit=None):
+        """Prints the transactions of an account in date order, optionally limited to a date range and a page"""
+        for transaction in acc.iter_transactions(start, end, offset, limit):
             print(transaction)
+
+    def list_statements(self, acc, start, end):
+        """Prints the monthly statements of an account from the month of start to the month of end"""
+        for statement in acc.get_statements(start, end):
+            print(statement)
     
     def summary(self):
         """Prints the summary of all accounts in the bank"""
         for account in self._accounts:
             formatted_balance = f"${account.balance:,.2f}"
             print(f"{account.get_id()},\tbalance: {formatted_balance}")
+
+    def run_month_end(self, year, month):
+        """Applies interest to every account, and the low balance fee where it is due, for the given month.
+
+        Interest and fees are computed for all accounts in one pass over their balances, rounded
+        half up to cents, and posted on the last day of the month. Accounts with no transactions,
+        with transactions after the month end, or already credited with interest that month, by
+        this or by Accounts.interest_and_fees, are skipped.
+
+        Returns a list with one dict per account: id, interest and fee posted (None if not posted)
+        and error (None, or the reason the account was skipped).
+        """
+        month_end = last_day_of_month(year, month)
+        accounts = self._accounts
+
+        balances = [account.balance for account in accounts]
+        interest = [balance.times_ratio(account.interest_ratio) for balance, account in zip(balances, accounts)]
+        fees = [account.low_balance_fee if account.low_balance_fee is not None
+                and balance + credit < account.balance_threshold else None
+                for balance, credit, account in zip(balances, interest, accounts)]
+
+        report = []
+        for account, balance, credit, fee in zip(accounts, balances, interest, fees):
+            result = {"id": account.get_id(), "interest": None, "fee": None, "error": None}
+            report.append(result)
+            if account._latest_date is None:
+                result["error"] = "no transactions"
+                continue
+            if account._latest_date > month_end:
+                result["error"] = f"has transactions after {month_end}"
+                continue
+            if account.month_end_posted(year, month):
+                result["error"] = "interest already applied"
+                continue
+
+            account._post(credit, month_end, is_interest=True)
+            result["interest"] = credit
+            if fee is not None:
+                if account.month_end_posted(year, month, is_fee=True):
+                    result["error"] = "fee already applied"
+                elif fee < -(balance + credit):
+                    result["error"] = "insufficient balance for fee"
+                else:
+                    account._post(fee, month_end, is_fees=True)
+                    result["fee"] = fee
+        return report
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import decimal
+import tempfile
+import contextlib
+from datetime import date, timedelta
+from accounts import Accounts, CheckingAccount
+from money import Money, rate_ratio
+from bank import Bank
+from exceptions import TransactionLimitError, TransactionSequenceError, OverdrawError
+from snapshot import write_snapshot, load_snapshot
+
+# history sizes at which per-insert latency is sampled
+SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+SAMPLE = 1_000
+START = date(2000, 1, 1)
+
+
+def _dates(start=START, per_day=50):
+    """Yields non-decreasing date strings, a few postings per day"""
+    day = start
+    while True:
+        text = str(day)
+        for _ in range(per_day):
+            yield text
+        day += timedelta(days=1)
+
+
+def bench_add_transaction(sizes=SIZES, sample=SAMPLE):
+    """Grows one account through each history size and times a window of inserts at that size.
+
+    Returns a list of (size, microseconds per insert) pairs.
+    """
+    account = CheckingAccount()
+    dates = _dates()
+    results = []
+    for size in sizes:
+        while len(account._transactions) < size:
+            account.add_transaction(1, next(dates))
+
+        start = time.perf_counter()
+        for _ in range(sample):
+            account.add_transaction(1, next(dates))
+        elapsed = time.perf_counter() - start
+        results.append((size, elapsed / sample * 1e6))
+    return results
+
+
+def bench_money(operations=100_000):
+    """Times the amount arithmetic of a posting and of a month-end interest credit, the way
+    they were done with Decimal and the way Money does them.
+
+    Returns a dict of results by workload, like run.
+    """
+    texts = [f"{k % 997}.{k % 100:02d}" for k in range(1_000)]
+    decimal_balances = [decimal.Decimal(text) for text in texts]
+    money_balances = [Money.parse(text) for text in texts]
+    rate = decimal.Decimal("0.0041")
+    ratio = rate_ratio(rate)  # as SavingsAccount.interest_ratio
+    cent = decimal.Decimal("0.01")
+    clock = time.perf_counter
+
+    def decimal_posting():
+        # float(input()), Decimal(amount) in set_balance and the ledger's to_cents
+        balance = decimal.Decimal(0)
+        for k in range(operations):
+            amount = float(texts[k % 1_000])
+            balance += decimal.Decimal(amount)
+            int(decimal.Decimal(amount).scaleb(2).quantize(1, rounding=decimal.ROUND_HALF_UP))
+
+    def money_posting():
+        balance = Money(0)
+        for k in range(operations):
+            amount = Money.parse(texts[k % 1_000])
+            balance += amount
+            amount.cents
+
+    def decimal_interest():
+        for k in range(operations):
+            (decimal_balances[k % 1_000] * rate).quantize(cent, rounding=decimal.ROUND_HALF_UP)
+
+    def money_interest():
+        for k in range(operations):
+            money_balances[k % 1_000].times_ratio(ratio)
+
+    results = {}
+    for name, function in [("decimal_posting", decimal_posting), ("money_posting", money_posting),
+                           ("decimal_interest", decimal_interest), ("money_interest", money_interest)]:
+        start = clock()
+        function()
+        results[name] = stats([clock() - start], operations)
+    return results
+
+
+def stats(samples, operations=None):
+    """Summarizes per-operation timings in seconds as throughput and p50/p99 latency in microseconds"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    operations = operations or len(ordered)
+    return {
+        "operations": operations,
+        "seconds": total,
+        "per_second": operations / total if total else 0.0,
+        "p50_us": ordered[len(ordered) // 2] * 1e6 if ordered else 0.0,
+        "p99_us": ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)] * 1e6 if ordered else 0.0,
+    }
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _post_all(bank, accounts, transactions):
+    """Posts transactions round-robin over accounts, one day per round, timing each posting"""
+    samples = []
+    rejected = 0
+    clock = time.perf_counter
+    for k in range(transactions):
+        account = accounts[k % len(accounts)]
+        day = str(START + timedelta(days=k // len(accounts)))
+        start = clock()
+        try:
+            account.add_transaction(100 if k < len(accounts) else 1, day)
+        except (TransactionLimitError, TransactionSequenceError, OverdrawError):
+            rejected += 1
+        samples.append(clock() - start)
+    return samples, rejected
+
+
+def run(transactions, accounts):
+    """Runs every workload against one bank of the given size and returns the results by workload"""
+    Accounts.last_id = 1
+    bank = Bank()
+    checking = [bank.create_account("checking") for _ in range(max(1, accounts // 2))]
+    savings = [bank.create_account("savings") for _ in range(max(1, accounts - len(checking)))]
+    results = {}
+
+    samples, _ = _post_all(bank, checking, transactions)
+    results["posting"] = stats(samples)
+
+    # savings accounts take one posting per day, so most of each month is rejected by the limits
+    samples, rejected = _post_all(bank, savings, max(len(savings), transactions // 10))
+    results["limit_checks"] = stats(samples)
+    results["limit_checks"]["rejected"] = rejected
+
+    busiest = checking[0]
+    page = max(1, len(busiest._transactions) // 100)
+    samples = [_timed(lambda o: list(busiest.iter_transactions(offset=o, limit=page)), offset)
+               for offset in range(0, len(busiest._transactions), page)]
+    results["listing_page"] = stats(samples)
+    results["listing_full"] = stats([_timed(lambda: list(busiest.iter_transactions()))])
+
+    # about a hundred days spread over the busiest account's history
+    days = transactions // len(checking) + 1
+    results["balance_as_of"] = stats([_timed(busiest.balance_as_of, START + timedelta(days=day))
+                                      for day in range(0, days, max(1, days // 100))])
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results["summary"] = stats([_timed(bank.summary)], len(bank._accounts))
+
+    last = busiest._latest_date
+    results["month_end"] = stats([_timed(bank.run_month_end, last.year, last.month)], len(bank._accounts))
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "bank.pickle")
+        snapshot_path = os.path.join(directory, "bank.snapshot")
+
+        def pickle_save():
+            with open(pickle_path, "wb") as f:
+                pickle.dump(bank, f)
+
+        def pickle_load():
+            with open(pickle_path, "rb") as f:
+                pickle.load(f)
+
+        results["pickle_save"] = stats([_timed(pickle_save)])
+        results["pickle_load"] = stats([_timed(pickle_load)])
+        results["snapshot_save"] = stats([_timed(write_snapshot, bank, snapshot_path)])
+        start = time.perf_counter()
+        loaded = load_snapshot(snapshot_path)
+        results["snapshot_load"] = stats([time.perf_counter() - start])
+        loaded._snapshot_reader.close()
+    return results
+
+
+def compare(results, baseline):
+    """Prints the throughput change of every workload present in both result sets"""
+    for key, result in results.items():
+        old = baseline.get(key)
+        if not old or not old["per_second"]:
+            continue
+        change = (result["per_second"] / old["per_second"] - 1) * 100
+        print(f"{key:<40} {old['per_second']:>14,.0f} -> {result['per_second']:>14,.0f} ops/s ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the BankAPP engine")
+    parser.add_argument("--transactions", type=int, nargs="+", default=[1_000],
+                        help="number of postings per run, e.g. 1000 100000 1000000")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[100],
+                        help="number of accounts per run, e.g. 100 10000 100000")
+    parser.add_argument("--growth", type=int, nargs="*",
+                        help="only measure per-insert latency as one account grows through these sizes")
+    parser.add_argument("--money", type=int, nargs="?", const=100_000,
+                        help="only compare the Decimal and Money amount arithmetic over this many operations")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare throughput against results saved by an earlier run")
+    args = parser.parse_args(argv)
+
+    if args.growth is not None:
+        for size, usec in bench_add_transaction(args.growth or SIZES):
+            print(f"{size:>10,} transactions: {usec:8.2f} us/insert")
+        return
+    if args.money is not None:
+        for workload, result in bench_money(args.money).items():
+            print(f"{workload:<20} {result['per_second']:>14,.0f} ops/s")
+        return
+
+    results = {}
+    for transactions in args.transactions:
+        for accounts in args.accounts:
+            for workload, result in run(transactions, accounts).items():
+                key = f"bankapp/{workload}/{transactions}tx/{accounts}acct"
+                results[key] = result
+                print(f"{key:<40} {result['per_second']:>14,.0f} ops/s  "
+                      f"p50 {result['p50_us']:>10,.1f} us  p99 {result['p99_us']:>10,.1f} us")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,13 +1,14 @@
 import sys
-import pickle
 from datetime import datetime, date
 from bank import Bank
 from accounts import Accounts, SavingsAccount, CheckingAccount
 from transaction import Transaction
 from exceptions import TransactionLimitError, TransactionSequenceError, OverdrawError
-import decimal
+from importer import import_transactions
+from journal import Journal
+from money import Money
 import logging
-decimal.getcontext().rounding = decimal.ROUND_HALF_UP
+import logconfig
 
 
 
@@ -22,6 +23,7 @@ class BankCLI:
 
     def __init__(self):
         self._bank = Bank()
+        self._journal = Journal()
         self.selected_acc = None
         self._choices = {
             "1": self._open_account,
@@ -33,6 +35,9 @@ class BankCLI:
             "7": self._save,
             "8": self._load,
             "9": self._quit,
+            "10": self._month_end,
+            "11": self._import_transactions,
+            "12": self._statements,
         }
 
         self.display_account = None
@@ -51,6 +56,9 @@ Enter command
 7: save
 8: load
 9: quit
+10: month end
+11: import transactions
+12: monthly statements
 >""", end="")
 
     def run(self):
@@ -72,7 +80,8 @@ Enter command
     def _open_account(self):
         account_type = input("Type of account? (checking/savings)\n>").lower()
         new_acc = self._bank.create_account(account_type)
-        logging.debug(f"Created account: {new_acc.get_id()}")
+        logging.debug("Created account: %s", new_acc.get_id(),
+                      extra={"event": "account_opened", "account_id": new_acc.get_id()})
 
     def _summary(self): 
         self._bank.summary()
@@ -102,7 +111,7 @@ Enter command
 
         while True:
             try:
-                amount = float(input("Amount?\n>"))
+                amount = Money.parse(input("Amount?\n>"))
                 break  
             except ValueError:
                 print("Please try again with a valid dollar amount.")
@@ -118,7 +127,9 @@ Enter command
         try:
             
             self.selected_acc.add_transaction(amount, transaction_date)
-            logging.debug(f"Created transaction: {self.selected_acc.get_id()}, {amount}")
+            logging.debug("Created transaction: %s, %s", self.selected_acc.get_id(), amount,
+                          extra={"event": "posting", "account_id": self.selected_acc.get_id(),
+                                 "amount": amount, "date": transaction_date})
             
 
 
@@ -148,8 +159,13 @@ Enter command
             raise NoAccountSelectedError
         try:
             self.selected_acc.interest_and_fees()
-            logging.debug("Triggered interest and fees")
-            logging.debug(f"Created transaction: {self.selected_acc.get_id()}, {self.selected_acc.get_latest_transaction().get_amount()}")
+            logging.debug("Triggered interest and fees",
+                          extra={"event": "interest_and_fees", "account_id": self.selected_acc.get_id(),
+                                 "balance": self.selected_acc.balance})
+            latest = self.selected_acc.get_latest_transaction()
+            logging.debug("Created transaction: %s, %s", self.selected_acc.get_id(), latest.get_amount(),
+                          extra={"event": "posting", "account_id": self.selected_acc.get_id(),
+                                 "amount": latest.get_amount(), "interest": latest.is_interest, "fee": latest.is_fee})
         except TransactionSequenceError as e:
             print(f"Cannot apply interest and fees again in the month of {e.latest_date}.")
             return
@@ -158,6 +174,64 @@ Enter command
         self.display_account = f"{self.selected_acc.get_id()},\tbalance: {formatted_balance}"
 
         
+    def _month_end(self):
+        while True:
+            month = input("Month? (YYYY-MM)\n>")
+            try:
+                month = datetime.strptime(month, "%Y-%m")
+                break
+            except ValueError:
+                print("Please try again with a valid month in the format YYYY-MM.")
+
+        report = self._bank.run_month_end(month.year, month.month)
+        interest = sum(1 for result in report if result["interest"] is not None)
+        fees = sum(1 for result in report if result["fee"] is not None)
+        skipped = sum(1 for result in report if result["interest"] is None)
+        logging.debug("Triggered month end for %s: %s interest, %s fees, %s skipped",
+                      f"{month:%Y-%m}", interest, fees, skipped,
+                      extra={"event": "month_end", "month": f"{month:%Y-%m}", "interest_accounts": interest,
+                             "fee_accounts": fees, "skipped_accounts": skipped})
+        print(f"Applied interest to {interest} accounts and fees to {fees} accounts; {skipped} accounts skipped.")
+
+        if self.selected_acc is not None:
+            formatted_balance = f"${self.selected_acc.balance:,.2f}"
+            self.display_account = f"{self.selected_acc.get_id()},\tbalance: {formatted_balance}"
+
+    def _import_transactions(self):
+        path = input("File to import? (.csv or .jsonl)\n>")
+        base, dot, extension = path.rpartition(".")
+        rejects_path = f"{base}.rejects.{extension}" if dot else f"{path}.rejects"
+
+        try:
+            summary = import_transactions(self._bank, path, rejects_path)
+        except OSError as e:
+            print(f"Could not import {path}: {e.strerror}")
+            return
+        logging.debug("Imported %s: %s accepted, %s rejected", path, summary['accepted'], summary['rejected'],
+                      extra={"event": "import", "path": path, "rows": summary['rows'],
+                             "accepted": summary['accepted'], "rejected": summary['rejected']})
+        print(f"{summary['rows']} rows read, {summary['accepted']} posted, {summary['rejected']} rejected "
+              f"({summary['rows_per_second']:,.0f} rows/s).")
+        if summary["rejected"]:
+            print(f"Rejected rows were written to {rejects_path}.")
+
+        if self.selected_acc is not None:
+            formatted_balance = f"${self.selected_acc.balance:,.2f}"
+            self.display_account = f"{self.selected_acc.get_id()},\tbalance: {formatted_balance}"
+
+    def _statements(self):
+        if self.selected_acc is None:
+            raise NoAccountSelectedError
+        while True:
+            try:
+                start = datetime.strptime(input("First month? (YYYY-MM)\n>"), "%Y-%m")
+                end = input("Last month? (YYYY-MM, blank for the first month)\n>")
+                end = datetime.strptime(end, "%Y-%m") if end else start
+                break
+            except ValueError:
+                print("Please try again with a valid month in the format YYYY-MM.")
+        self._bank.list_statements(self.selected_acc, start, end)
+
     def _list_transaction(self):
         if self.selected_acc is None:
             raise NoAccountSelectedError
@@ -165,23 +239,27 @@ Enter command
 
     def _save(self):
         self.selected_acc = None
-        with open("bank.pickle", "wb") as f:
-            pickle.dump(self._bank, f)
-        logging.debug("Saved to bank.pickle")
+        if self._bank._journal is self._journal:
+            # changes since the last save are already in the journal
+            self._journal.save()
+            logging.debug("Saved to bank.journal")
+        else:
+            self._journal.start(self._bank)
+            logging.debug("Saved to bank.snapshot")
        
 
     def _load(self):
-        with open("bank.pickle", "rb") as f:   
-            self._bank = pickle.load(f)
-        logging.debug("Loaded from bank.pickle")
+        self._bank = self._journal.load()
+        logging.debug("Loaded from bank.snapshot and bank.journal")
     
     def _quit(self):
+        self._journal.close()
         sys.exit(0)
         
                         
 
 if __name__ == "__main__":
-    logging.basicConfig(filename='bank.log', level=logging.DEBUG, format='%(asctime)s|%(levelname)s|%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    logconfig.configure('bank.log')
 
 
     try:
@@ -190,4 +268,4 @@ if __name__ == "__main__":
         print("Sorry! Something unexpected happened. Check the logs or contact the developer for assistance.")
         ex_type = type(ex).__name__
         ex_message = repr(ex.args[0]) if ex.args else "<no message>"  
-        logging.error(f"{ex_type}: {ex_message}")
+        logging.error("%s: %s", ex_type, ex_message)
@@ -0,0 +1,116 @@
+import csv
+import json
+import time
+from exceptions import TransactionLimitError, TransactionSequenceError, OverdrawError
+from money import Money
+
+FIELDS = ["account", "date", "amount"]
+
+
+def _read_rows(f, is_jsonl):
+    """Yields (account, date, amount, invalid) rows from an open CSV or JSON lines file.
+
+    invalid is None, or (line, reason) for a JSON line that is not a JSON object, which has no other fields.
+    """
+    if is_jsonl:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None, None, None, (line, "invalid JSON")
+                continue
+            if not isinstance(record, dict):
+                yield None, None, None, (line, "not a JSON object")
+                continue
+            yield record.get("account"), record.get("date"), record.get("amount"), None
+    else:
+        reader = csv.reader(f)
+        for row in reader:
+            if not row:
+                continue
+            if reader.line_num == 1 and row[0].strip().lower() == "account":
+                continue  # header
+            row = row + [None] * (3 - len(row))
+            yield row[0], row[1], row[2], None
+
+
+def _account_number(account):
+    "Accepts 1, '1', '000000001' or 'Checking#000000001' and returns 1"
+    return int(str(account).rsplit("#", 1)[-1])
+
+
+def import_transactions(bank, path, rejects_path):
+    """Posts every (account, date, amount) row of a CSV or JSON lines file to the bank.
+
+    Rows are read one at a time and go through the same overdraft, sequence and savings limit
+    rules as transactions entered by hand, so memory use does not grow with the file. Rows that
+    cannot be posted are written to rejects_path, in the input format, with a reason column.
+    JSON lines that cannot be read are written as {"line": ..., "reason": ...} and the import carries on.
+
+    Returns a summary dict with the number of rows read, accepted and rejected, the elapsed
+    seconds and the throughput in rows per second.
+    """
+    is_jsonl = path.endswith((".jsonl", ".json"))
+    rows = accepted = 0
+    account_key, account = None, None
+    start = time.perf_counter()
+
+    with open(path, newline="") as f, open(rejects_path, "w", newline="") as rejects:
+        if is_jsonl:
+            def reject(account_id, date, amount, reason):
+                rejects.write(json.dumps({"account": account_id, "date": date,
+                                          "amount": amount, "reason": reason}) + "\n")
+
+            def reject_line(line, reason):
+                rejects.write(json.dumps({"line": line.rstrip("\r\n"), "reason": reason}) + "\n")
+        else:
+            writer = csv.writer(rejects)
+            writer.writerow(FIELDS + ["reason"])
+
+            def reject(account_id, date, amount, reason):
+                writer.writerow([account_id, date, amount, reason])
+
+        for account_id, date, amount, invalid in _read_rows(f, is_jsonl):
+            rows += 1
+            if invalid is not None:
+                reject_line(*invalid)
+                continue
+            # consecutive rows for the same account skip the lookup
+            if account_id != account_key:
+                try:
+                    account = bank._find_account(_account_number(account_id))
+                except ValueError:
+                    account = None
+                account_key = account_id
+            if account is None:
+                reject(account_id, date, amount, "unknown account")
+                continue
+            try:
+                value = Money.of(amount)
+            except (TypeError, ValueError):
+                reject(account_id, date, amount, "invalid amount")
+                continue
+
+            try:
+                account.add_transaction(value, str(date))
+            except OverdrawError:
+                reject(account_id, date, amount, "insufficient balance")
+            except TransactionLimitError as e:
+                reject(account_id, date, amount, f"{e.limit_type} limit reached")
+            except TransactionSequenceError as e:
+                reject(account_id, date, amount, f"must be from {e.latest_date} onward")
+            except ValueError:
+                reject(account_id, date, amount, "invalid date")
+            else:
+                accepted += 1
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "accepted": accepted,
+        "rejected": rows - accepted,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+    }
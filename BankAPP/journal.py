@@ -0,0 +1,163 @@
+import os
+import json
+import pickle
+import logging
+from bank import Bank
+from accounts import Accounts, parse_date
+from money import Money
+from snapshot import load_snapshot, write_snapshot
+
+
+class Journal:
+    """Write-ahead journal of account openings and postings, with periodic snapshots.
+
+    Every change to an attached bank is appended to the journal file as a JSON line when it
+    happens. A save after snapshot_every or more records writes the whole bank to the snapshot file
+    and starts the journal over, so recovery replays only the records since the last such save.
+    A bank pickled by older versions is read from pickle_path when there is no snapshot yet.
+    """
+
+    def __init__(self, path="bank.journal", snapshot_path="bank.snapshot", snapshot_every=1000,
+                 pickle_path="bank.pickle"):
+        self._path = path
+        self._snapshot_path = snapshot_path
+        self._pickle_path = pickle_path
+        self._snapshot_every = snapshot_every
+        self._bank = None
+        self._file = None
+        self._since_snapshot = 0
+
+    def load(self):
+        """Loads the latest snapshot, replays the journal records written after it and attaches to the result"""
+        self.close()
+        bank, replayed = self._replay(truncate=True)
+        self._attach(bank)
+        self._since_snapshot = replayed
+        return bank
+
+    def read(self):
+        """Loads the latest snapshot and replays the journal records written after it, without attaching to the result.
+
+        Nothing is written: the journal is not opened for appending and a record cut short by a crash is
+        skipped rather than dropped from the file, so the bank can be inspected while it is in use.
+        """
+        bank, _ = self._replay(truncate=False)
+        return bank
+
+    def _replay(self, truncate):
+        """Returns the bank in the latest snapshot (or pickle) with the later journal records applied, and their number"""
+        if os.path.exists(self._snapshot_path):
+            bank = load_snapshot(self._snapshot_path)
+        elif os.path.exists(self._pickle_path):
+            with open(self._pickle_path, "rb") as f:
+                bank = pickle.load(f)
+        else:
+            bank = Bank()
+        Accounts.last_id = max(Accounts.last_id, bank._next_number())
+
+        replayed = 0
+        for record in self._records(truncate):
+            if record["seq"] <= bank._journal_seq:
+                continue  # already part of the snapshot
+            self._apply(bank, record)
+            bank._journal_seq = record["seq"]
+            replayed += 1
+        logging.debug("Replayed %s journal records on top of %s", replayed, self._snapshot_path)
+        return bank, replayed
+
+    def start(self, bank):
+        """Attaches to a bank that was not loaded from this journal, writing it out as a fresh snapshot.
+
+        The bank's records are numbered on from the last one in the journal, so the snapshot covers every
+        record already there and none of them is replayed onto it if the journal is not emptied after it.
+        """
+        self.close()
+        bank._journal_seq = max([bank._journal_seq, *(record["seq"] for record in self._records(truncate=False))])
+        self._attach(bank)
+        self.snapshot()
+
+    def save(self):
+        """Makes every record written so far durable, taking a snapshot if one is due"""
+        if self._file is None:
+            return
+        if self._since_snapshot >= self._snapshot_every:
+            self.snapshot()
+        else:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def snapshot(self):
+        """Writes the attached bank to the snapshot file and starts an empty journal"""
+        write_snapshot(self._bank, self._snapshot_path)
+
+        # records up to _journal_seq are in the snapshot, so a crash before this point replays nothing twice
+        self._file.close()
+        self._file = open(self._path, "w")
+        self._since_snapshot = 0
+        logging.debug("Saved snapshot to %s", self._snapshot_path)
+
+    def close(self):
+        """Flushes and detaches from the current bank"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._bank is not None:
+            self._bank._journal = None
+            for account in self._bank._accounts:
+                account._listener = None
+            self._bank = None
+
+    def account_opened(self, account):
+        """Records a new account of an attached bank"""
+        account._listener = self.transaction_posted
+        self._write({"op": "open", "type": account.get_type(), "number": account.get_number()})
+
+    def transaction_posted(self, account, amount, transaction_date, is_interest, is_fee):
+        """Records a posting to an account of an attached bank"""
+        self._write({"op": "post", "number": account.get_number(), "date": transaction_date.isoformat(),
+                     "amount": str(Money.of(amount)), "interest": bool(is_interest), "fee": bool(is_fee)})
+
+    def _attach(self, bank):
+        self._bank = bank
+        bank._journal = self
+        for account in bank._accounts:
+            account._listener = self.transaction_posted
+        self._file = open(self._path, "a")
+
+    def _write(self, record):
+        self._bank._journal_seq += 1
+        record["seq"] = self._bank._journal_seq
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._since_snapshot += 1
+
+    def _records(self, truncate=True):
+        """Yields the journal records in order.
+
+        A last line cut short by a crash is dropped from the file, if truncate is set, so new records start on a fresh line.
+        """
+        if not os.path.exists(self._path):
+            return
+        good_size = 0
+        with open(self._path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    logging.error("%s incomplete journal record: %r", "Dropping" if truncate else "Skipping", line)
+                    break
+                good_size += len(line)
+                yield record
+        if truncate and good_size != os.path.getsize(self._path):
+            os.truncate(self._path, good_size)
+
+    @staticmethod
+    def _apply(bank, record):
+        if record["op"] == "open":
+            bank._restore_account(record["type"], record["number"])
+        elif record["op"] == "post":
+            account = bank._find_account(record["number"])
+            account._post(Money.parse(record["amount"]), parse_date(record["date"]),
+                          record["interest"], record["fee"])
@@ -0,0 +1,119 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from datetime import datetime, date
+from money import Money
+from transaction import Transaction
+
+# flag bits stored per posting
+INTEREST = 1
+FEE = 2
+
+
+def to_cents(amount):
+    "Converts a dollar amount (Money, int, float, Decimal or text) to integer cents, rounding half up"
+    return Money.of(amount).cents
+
+
+class Ledger:
+    """Columnar transaction history of an account.
+
+    Each posting is stored as a date ordinal, an amount in integer cents and a byte of flag bits,
+    each in its own array. Transaction objects are only created when a posting is read.
+    A fourth array holds the running balance after each posting; it is derived from the
+    cents, so it is rebuilt rather than saved.
+    """
+
+    def __init__(self):
+        self._dates = array('i')
+        self._cents = array('q')
+        self._flags = array('B')
+        self._totals = array('q')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_totals", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._totals = array('q', accumulate(self._cents))
+
+    def append(self, transaction_date, cents, is_interest=False, is_fee=False):
+        "Adds a posting for a date object and an amount in cents"
+        self._dates.append(transaction_date.toordinal())
+        self._cents.append(cents)
+        self._flags.append((INTEREST if is_interest else 0) | (FEE if is_fee else 0))
+        self._totals.append(self._totals[-1] + cents if self._totals else cents)
+
+    def balance_as_of(self, ordinal):
+        """Returns the balance in cents after every posting dated on or before a date ordinal
+
+        Postings are appended in date order, so the last one on or before the date is found by bisection.
+        """
+        index = bisect_right(self._dates, ordinal)
+        return self._totals[index - 1] if index else 0
+
+    def rows(self):
+        "Yields (date ordinal, cents, flags) for every posting in insertion order"
+        return zip(self._dates, self._cents, self._flags)
+
+    def _view(self, ordinal, cents, flags):
+        return Transaction(date.fromordinal(ordinal).isoformat(),
+                           Money(cents),
+                           is_interest=bool(flags & INTEREST),
+                           is_fee=bool(flags & FEE))
+
+    def __len__(self):
+        return len(self._cents)
+
+    def __getitem__(self, index):
+        "Returns the posting at index as a Transaction"
+        return self._view(self._dates[index], self._cents[index], self._flags[index])
+
+    def __iter__(self):
+        for row in self.rows():
+            yield self._view(*row)
+
+    def iter_range(self, start=None, end=None, offset=0, limit=None):
+        """Yields the postings dated from start to end (inclusive dates, None for no bound),
+        skipping the first offset of them and stopping after limit.
+
+        Postings are appended in date order, so the bounds are found by bisection.
+        """
+        first = 0 if start is None else bisect_left(self._dates, start.toordinal())
+        last = len(self._dates) if end is None else bisect_right(self._dates, end.toordinal())
+        first += offset
+        if limit is not None:
+            last = min(last, first + limit)
+        for index in range(first, last):
+            yield self._view(self._dates[index], self._cents[index], self._flags[index])
+
+    def to_bytes(self):
+        "Returns the dates, cents and flags columns as one block of bytes, in that order"
+        return self._dates.tobytes() + self._cents.tobytes() + self._flags.tobytes()
+
+    @classmethod
+    def from_bytes(cls, buffer, offset, rows):
+        "Builds a ledger of rows postings from a block written by to_bytes at offset in buffer"
+        ledger = cls()
+        end = offset + rows * ledger._dates.itemsize
+        ledger._dates.frombytes(buffer[offset:end])
+        offset, end = end, end + rows * ledger._cents.itemsize
+        ledger._cents.frombytes(buffer[offset:end])
+        offset, end = end, end + rows * ledger._flags.itemsize
+        ledger._flags.frombytes(buffer[offset:end])
+        ledger._totals = array('q', accumulate(ledger._cents))
+        return ledger
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        "Builds a ledger from Transaction objects, as stored by older saves"
+        ledger = cls()
+        for transaction in transactions:
+            ledger._dates.append(datetime.strptime(transaction._date, "%Y-%m-%d").toordinal())
+            ledger._cents.append(to_cents(transaction.amount))
+            ledger._flags.append((INTEREST if transaction.is_interest else 0)
+                                 | (FEE if getattr(transaction, "is_fee", False) else 0))
+        ledger._totals = array('q', accumulate(ledger._cents))
+        return ledger
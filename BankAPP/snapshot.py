@@ -0,0 +1,108 @@
+import os
+import mmap
+import struct
+from bank import Bank
+from money import Money
+from accounts import CheckingAccount, SavingsAccount
+
+# File layout: header, account directory, balance strings, ledger segments.
+# Each ledger segment holds an account's date ordinals, then its cents, then its flags,
+# in the machine's native byte order.
+MAGIC = b"BANKSNP1"
+HEADER = struct.Struct("<8sqI")  # magic, journal sequence number, number of accounts
+# number, type, ledger rows, ledger offset, balance offset, balance length
+ENTRY = struct.Struct("<IBQQQH")
+ROW_SIZE = 4 + 8 + 1
+
+TYPES = {0: CheckingAccount, 1: SavingsAccount}
+TYPE_CODES = {CheckingAccount: 0, SavingsAccount: 1}
+
+
+class SnapshotReader:
+    """Read-only memory map of a snapshot file, shared by the accounts loaded from it"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self.buffer.close()
+        self._file.close()
+
+
+def write_snapshot(bank, path):
+    """Writes the bank to path in the snapshot format, replacing the file atomically.
+
+    Accounts that were loaded lazily and never used are copied from their old segment without
+    being materialized, and afterwards point at their segment in the new file.
+    """
+    accounts = bank._accounts
+    balances = [str(account.balance).encode() for account in accounts]
+    directory_size = HEADER.size + ENTRY.size * len(accounts)
+    balance_offset = directory_size
+    ledger_offset = directory_size + sum(len(balance) for balance in balances)
+
+    temp_path = path + ".tmp"
+    lazy = []
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, bank._journal_seq, len(accounts)))
+        for account, balance in zip(accounts, balances):
+            segment = account.__dict__.get("_segment")
+            rows = segment[2] if segment is not None else len(account._transactions)
+            f.write(ENTRY.pack(account.get_number(), TYPE_CODES[type(account)],
+                               rows, ledger_offset, balance_offset, len(balance)))
+            if segment is not None:
+                lazy.append((account, ledger_offset))
+            balance_offset += len(balance)
+            ledger_offset += rows * ROW_SIZE
+        for balance in balances:
+            f.write(balance)
+        for account in accounts:
+            segment = account.__dict__.get("_segment")
+            if segment is not None:
+                reader, offset, rows = segment
+                f.write(reader.buffer[offset:offset + rows * ROW_SIZE])
+            else:
+                f.write(account._transactions.to_bytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    # the old mapping has to be closed before its file can be replaced on Windows
+    old_reader = getattr(bank, "_snapshot_reader", None)
+    if old_reader is not None:
+        old_reader.close()
+    os.replace(temp_path, path)
+
+    bank._snapshot_reader = None
+    if lazy:
+        bank._snapshot_reader = SnapshotReader(path)
+        for account, offset in lazy:
+            account._segment = (bank._snapshot_reader, offset, account._segment[2])
+
+
+def load_snapshot(path):
+    """Maps a snapshot file and returns its bank.
+
+    Only the account directory is read; each account's transactions stay in the mapped file
+    until the account is first used.
+    """
+    reader = SnapshotReader(path)
+    buffer = reader.buffer
+    magic, journal_seq, count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        reader.close()
+        raise ValueError(f"{path} is not a bank snapshot")
+
+    bank = Bank()
+    bank._journal_seq = journal_seq
+    bank._snapshot_reader = reader
+    for number, type_code, rows, ledger_offset, balance_offset, balance_length in ENTRY.iter_unpack(
+            buffer[HEADER.size:HEADER.size + ENTRY.size * count]):
+        account_type = TYPES[type_code]
+        account = account_type.__new__(account_type)
+        account.balance = Money.parse(buffer[balance_offset:balance_offset + balance_length].decode())
+        account._number = number
+        account._id = f"{account_type.__name__.replace('Account', '')}#{number:09d}"
+        account._segment = (reader, ledger_offset, rows)
+        bank._add_loaded_account(account)
+    return bank
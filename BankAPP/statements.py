@@ -0,0 +1,85 @@
+from money import Money
+
+
+class MonthlyStatement:
+    """Totals of one account's postings in one calendar month, kept up to date as they are posted.
+
+    Amounts are integer cents, like the ledger. Withdrawals and fees are negative, so the
+    closing balance is the opening balance plus the four totals.
+    """
+    __slots__ = ("year", "month", "opening_cents", "closing_cents", "deposits_cents",
+                 "withdrawals_cents", "interest_cents", "fees_cents", "count")
+
+    def __init__(self, year, month, balance_cents=0):
+        """Starts a month with no postings at the balance carried into it"""
+        self.year = year
+        self.month = month
+        self.opening_cents = self.closing_cents = balance_cents
+        self.deposits_cents = self.withdrawals_cents = 0
+        self.interest_cents = self.fees_cents = 0
+        self.count = 0
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def add(self, cents, is_interest=False, is_fee=False):
+        "Adds a posting of cents to the totals"
+        if is_interest:
+            self.interest_cents += cents
+        elif is_fee:
+            self.fees_cents += cents
+        elif cents >= 0:
+            self.deposits_cents += cents
+        else:
+            self.withdrawals_cents += cents
+        self.closing_cents += cents
+        self.count += 1
+
+    def carried(self, year, month):
+        "Returns the statement of a later month without postings"
+        return MonthlyStatement(year, month, self.closing_cents)
+
+    @property
+    def opening(self):
+        return Money(self.opening_cents)
+
+    @property
+    def closing(self):
+        return Money(self.closing_cents)
+
+    @property
+    def deposits(self):
+        return Money(self.deposits_cents)
+
+    @property
+    def withdrawals(self):
+        return Money(self.withdrawals_cents)
+
+    @property
+    def interest(self):
+        return Money(self.interest_cents)
+
+    @property
+    def fees(self):
+        return Money(self.fees_cents)
+
+    def __str__(self):
+        """Formats the month and its totals, e.g.
+        2024-03, opening: $50.00, deposits: $20.00, withdrawals: -$5.00, interest: $0.04, fees: $0.00, closing: $65.04, 3 transactions"""
+        def dollars(amount):
+            return f"-${-amount:,.2f}" if amount < 0 else f"${amount:,.2f}"
+        return (f"{self.year}-{self.month:02}, opening: {dollars(self.opening)}, deposits: {dollars(self.deposits)}, "
+                f"withdrawals: {dollars(self.withdrawals)}, interest: {dollars(self.interest)}, "
+                f"fees: {dollars(self.fees)}, closing: {dollars(self.closing)}, {self.count} transactions")
+
+
+def months(start, end):
+    "Yields (year, month) from the month of the date start to the month of the date end"
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
@@ -0,0 +1,49 @@
+import unittest
+from datetime import date
+from money import Money
+from ledger import Ledger
+from audit import audit_account
+
+
+def ledger(*postings):
+    "Builds a Ledger from (YYYY-MM-DD, cents, is_interest, is_fee) postings"
+    result = Ledger()
+    for day, cents, is_interest, is_fee in postings:
+        result.append(date.fromisoformat(day), cents, is_interest, is_fee)
+    return result
+
+
+def checks(discrepancies):
+    return [(d["check"], d["date"]) for d in discrepancies]
+
+
+class AuditAccountTest(unittest.TestCase):
+
+    def test_ordinary_posting_equal_to_the_fee(self):
+        # a customer withdrawal of 5.44 on the last day, then the month's own interest and fee
+        postings = ledger(("2024-01-05", 5000, False, False), ("2024-01-31", -544, False, False),
+                          ("2024-01-31", 4, True, False), ("2024-01-31", -544, False, True))
+        balance = Money(5000 - 544 + 4 - 544)
+        self.assertEqual(audit_account("Checking#000000001", "checking", balance, postings), [])
+
+    def test_ordinary_posting_equal_to_the_interest_counts_toward_limits(self):
+        # 0.82 is the interest on 200.00, but these are three deposits on one day
+        postings = ledger(("2024-01-05", 20000, False, False), ("2024-01-31", 82, False, False),
+                          ("2024-01-31", 100, False, False), ("2024-01-31", 100, False, False))
+        balance = Money(20000 + 82 + 100 + 100)
+        self.assertEqual(checks(audit_account("Savings#000000001", "savings", balance, postings)),
+                         [("daily_limit", "2024-01-31")])
+
+    def test_legacy_flags(self):
+        # interest and fee recorded without flags, then charged again by month end
+        postings = ledger(("2024-01-05", 5000, False, False), ("2024-01-31", 4, False, False),
+                          ("2024-01-31", -544, False, False), ("2024-01-31", 4, True, False),
+                          ("2024-01-31", -544, False, True))
+        balance = Money(5000 + 4 - 544 + 4 - 544)
+        self.assertEqual(audit_account("Checking#000000001", "checking", balance, postings), [])
+        self.assertEqual(checks(audit_account("Checking#000000001", "checking", balance, postings, legacy_flags=True)),
+                         [("month_end", "2024-01-31"), ("month_end", "2024-01-31")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from money import Money
+from bank import Bank
+from journal import Journal
+from snapshot import write_snapshot
+
+
+class JournalStartTest(unittest.TestCase):
+    """A bank started on an existing journal does not pick up that journal's records"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def journal(self):
+        return Journal(os.path.join(self.directory, "bank.journal"), os.path.join(self.directory, "bank.snapshot"),
+                       pickle_path=os.path.join(self.directory, "bank.pickle"))
+
+    def test_crash_before_the_journal_is_emptied(self):
+        journal = self.journal()
+        old = journal.load()
+        old.create_account("checking").add_transaction(50, "2024-01-05")
+        journal.save()
+        journal.close()
+
+        new = Bank()
+        account = new.create_account("savings")
+        account.add_transaction(200, "2024-01-05")
+        journal = self.journal()
+        # the snapshot is written, then the process dies before the journal is opened anew
+        with mock.patch.object(Journal, "snapshot", lambda self: write_snapshot(self._bank, self._snapshot_path)):
+            journal.start(new)
+        journal.close()
+
+        journal = self.journal()
+        recovered = journal.read()
+        self.assertEqual([(a.get_id(), a.balance) for a in recovered._accounts],
+                         [(account.get_id(), Money.parse("200.00"))])
+        recovered._snapshot_reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from money import Money
+from bank import Bank
+from ledger import INTEREST, FEE
+from exceptions import TransactionSequenceError
+
+
+def month_end_postings(account):
+    "Returns the (cents, flags) of the interest and fee postings of an account"
+    return [(cents, flags) for _, cents, flags in account._transactions.rows() if flags & (INTEREST | FEE)]
+
+
+class MonthEndTest(unittest.TestCase):
+    """Interest and fees are posted once per month, whether by interest_and_fees or by Bank.run_month_end"""
+
+    def setUp(self):
+        self.bank = Bank()
+        self.checking = self.bank.create_account("checking")
+        self.checking.add_transaction(50, "2024-01-05")
+        self.savings = self.bank.create_account("savings")
+        self.savings.add_transaction(200, "2024-01-05")
+
+    def assert_posted_once(self):
+        self.assertEqual(self.checking.balance, Money.parse("44.60"))
+        self.assertEqual(month_end_postings(self.checking), [(4, INTEREST), (-544, FEE)])
+        self.assertEqual(self.savings.balance, Money.parse("200.82"))
+        self.assertEqual(month_end_postings(self.savings), [(82, INTEREST)])
+
+    def test_interest_and_fees_then_month_end(self):
+        self.checking.interest_and_fees()
+        self.savings.interest_and_fees()
+        report = self.bank.run_month_end(2024, 1)
+        self.assertEqual([result["error"] for result in report], ["interest already applied"] * 2)
+        self.assert_posted_once()
+
+    def test_month_end_then_interest_and_fees(self):
+        report = self.bank.run_month_end(2024, 1)
+        self.assertEqual([result["error"] for result in report], [None, None])
+        for account in (self.checking, self.savings):
+            with self.assertRaises(TransactionSequenceError) as raised:
+                account.interest_and_fees()
+            self.assertEqual(raised.exception.latest_date, "January")
+        self.assert_posted_once()
+
+    def test_interest_and_fees_twice(self):
+        self.checking.interest_and_fees()
+        with self.assertRaises(TransactionSequenceError):
+            self.checking.interest_and_fees()
+        self.savings.interest_and_fees()
+        self.assert_posted_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from datetime import date
+from money import Money
+from bank import Bank
+
+
+def totals(statement):
+    return (str(statement.opening), str(statement.deposits), str(statement.withdrawals),
+            str(statement.interest), str(statement.fees), str(statement.closing), statement.count)
+
+
+class CheckingStatementTest(unittest.TestCase):
+    """Checking interest and fees are kept apart from deposits and withdrawals in the monthly statements"""
+
+    def setUp(self):
+        self.bank = Bank()
+        self.account = self.bank.create_account("checking")
+        self.account.add_transaction(50, "2024-01-05")
+        self.account.add_transaction(Money.parse("-10"), "2024-01-10")
+        self.account.interest_and_fees()  # 0.03 interest on 40.00, then the fee below 100.00
+        self.account.add_transaction(Money.parse("20.50"), "2024-02-03")
+        self.bank.run_month_end(2024, 2)
+
+    def test_statements(self):
+        january, february, march = self.account.get_statements(date(2024, 1, 1), date(2024, 3, 1))
+        self.assertEqual(totals(january), ("0.00", "50.00", "-10.00", "0.03", "-5.44", "34.59", 4))
+        self.assertEqual(totals(february), ("34.59", "20.50", "0.00", "0.04", "-5.44", "49.69", 3))
+        self.assertEqual(totals(march), ("49.69", "0.00", "0.00", "0.00", "0.00", "49.69", 0))
+        self.assertEqual(self.account.balance, Money.parse("49.69"))
+
+    def test_interest_and_fees_do_not_count_toward_limits(self):
+        self.assertEqual(self.account._month_counts[(2024, 1)], 2)
+        self.assertEqual(self.account._month_counts[(2024, 2)], 1)
+        self.assertEqual(self.account._day_counts[date(2024, 1, 31)], 0)
+
+    def test_rebuilt_from_ledger(self):
+        expected = [totals(s) for s in self.account.get_statements(date(2024, 1, 1), date(2024, 2, 1))]
+        self.account._rebuild_index()
+        self.assertEqual([totals(s) for s in self.account.get_statements(date(2024, 1, 1), date(2024, 2, 1))],
+                         expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,23 @@
 from datetime import datetime, date
-import decimal
-# decimal.getcontext().rounding = decimal.ROUND_HALF_UP
 
 
 class Transaction:
-    decimal.setcontext(decimal.Context(rounding = decimal.ROUND_HALF_UP))
-    """This class stores amount and transaction date"""
+    """Read-only view of one posting in an account's ledger: Money amount and transaction date"""
+    __slots__ = ("_date", "amount", "is_interest", "is_fee")
 
     def __init__(self, date, amount, is_interest=False, is_fee=False):
         self._date = date
-        amount_str = amount.replace("$", "")  # Remove the dollar sign
-        amount_str = amount_str.replace(",", "")
-        self.amount = decimal.Decimal(amount_str)
+        self.amount = amount
         self.is_interest = is_interest
         self.is_fee = is_fee
+
+    def __setstate__(self, state):
+        """Restores transactions pickled by older saves, which stored their attributes in a dict"""
+        if isinstance(state, tuple):
+            state = state[1]
+        self.is_fee = False
+        for name, value in state.items():
+            setattr(self, name, value)
        
     def __str__(self):
         """Formats the way transactions are printed in string"""
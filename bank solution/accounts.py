@@ -1,18 +1,30 @@
 import logging
 from decimal import Decimal
 
-from transactions import Transaction, Base
+from transactions import Transaction, Base, to_cents, from_cents
+from money import Money
+from statements import MonthlyStatement, month_deltas, record_months, month_start, next_month
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, create_engine
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index, create_engine, func, insert
+from sqlalchemy.orm import relationship, backref, object_session
 from sqlalchemy.ext.declarative import declarative_base
 
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import functools
 
 from exceptions import OverdrawError, TransactionLimitError, TransactionSequenceError
 
 
+def _cents_property(column):
+    "Exposes an integer cents column as a Money attribute"
+    def get(self):
+        cents = getattr(self, column)
+        return None if cents is None else from_cents(cents)
+
+    def set(self, amount):
+        setattr(self, column, None if amount is None else to_cents(amount))
+    return property(get, set)
+
 
 class Account(Base):
     """This is an abstract class for accounts.  Provides default functionality for adding transactions, getting balances, and assessing interest and fees.  
@@ -21,11 +33,14 @@ class Account(Base):
     __tablename__ = 'account'
 
     _id = Column(Integer, primary_key = True)
-    _account_number = Column(Integer)
-    _transactions = relationship("Transaction", backref="account")
+    _account_number = Column(Integer, nullable=False)
+    # kept in date order: postings are only accepted on or after the latest date.
+    # Queried on demand, so touching the relationship never loads the whole ledger
+    _transactions = relationship("Transaction", backref="account", lazy="dynamic",
+                                 order_by=[Transaction._date, Transaction._id])
 
     _type = Column(String)  
-    _balance = Column(Float(asdecimal=True))
+    _balance_cents = Column(Integer, default=0)
     _interest_rate = Column(Float(asdecimal=True))
     _bank_id = Column(Integer, ForeignKey("bank._id"))
 
@@ -33,10 +48,12 @@ class Account(Base):
     _monthly_limit = Column(Integer, nullable=True)
 
 
-    _balance_threshold = Column(Float(asdecimal=True))
-    _low_balance_fee = Column(Float(asdecimal=True))
-    
-  
+    _balance_threshold_cents = Column(Integer)
+    _low_balance_fee_cents = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_account_bank_number", "_bank_id", "_account_number", unique=True),
+    )
 
     __mapper_args__ = {
         'polymorphic_identity':'account',
@@ -45,8 +62,13 @@ class Account(Base):
 
     def __init__(self, acct_num):
         self._account_number = acct_num
-        self._balance = Decimal(0.0)
-        logging.debug(f"Created account: {self._account_number}")
+        self._balance_cents = 0
+        logging.debug("Created account: %s", self._account_number,
+                      extra={"event": "account_opened", "account_number": self._account_number})
+
+    _balance = _cents_property("_balance_cents")
+    _balance_threshold = _cents_property("_balance_threshold_cents")
+    _low_balance_fee = _cents_property("_low_balance_fee_cents")
 
 
     # def _get_acct_num(self):
@@ -58,7 +80,7 @@ class Account(Base):
         """Creates a new transaction and checks to see if it is allowed, adding it to the account if it is.
 
         Args:
-            amt (Decimal): amount for new transaction
+            amt (Money): amount for new transaction
             date (Date): Date for the new transaction.
             exempt (bool, optional): Determines whether the transaction is exempt from account limits. Defaults to False.
         """
@@ -72,9 +94,81 @@ class Account(Base):
             self._check_balance(t)
             self._check_limits(t)
             self._check_date(t)
-        self._transactions.append(t)
-        self._balance += amt
+        # setting the parent adds the transaction to _transactions without querying it
+        t.account = self
+        opening = to_cents(self.get_balance())
+        self._balance = self.get_balance() + t._amt
         session.add(t)
+        if self._id is None:
+            session.flush()  # the monthly totals are keyed by the account's id
+        record_months(session, month_deltas(self._id, opening, [
+            {"_amt_cents": t._amt_cents, "_date": t.date, "_exempt": bool(t.is_exempt())}]))
+
+    def add_transactions(self, postings, session):
+        """Checks and adds many transactions with one bulk insert and one balance update.
+
+        Postings are checked in order, exactly as add_transaction would check them one at a time,
+        but against state read once up front instead of queried per posting. Rejected postings are
+        skipped and the rest are still added. Like add_transaction, nothing is committed.
+
+        Args:
+            postings (iterable): (amount, date) pairs
+            session (Session): session the account belongs to
+
+        Returns:
+            list: (index in postings, exception) for every rejected posting
+        """
+        session.flush()  # pending transactions count toward the state read below
+        latest_date = session.query(func.max(Transaction._date)).filter(Transaction.account == self).scalar()
+        rows, rejected = self._check_postings(postings, latest_date)
+        if rows:
+            session.execute(insert(Transaction.__table__), rows)
+            opening = self._balance_cents - sum(row["_amt_cents"] for row in rows)
+            record_months(session, month_deltas(self._id, opening, rows))
+        return rejected
+
+    def _check_postings(self, postings, latest_date):
+        """Checks postings against the balance, limits and latest date, updating the running balance for the accepted ones
+
+        Args:
+            postings (iterable): (amount, date) pairs
+            latest_date (Date): date of the latest stored transaction, or None
+
+        Returns:
+            tuple: (rows for a Transaction bulk insert, (index in postings, exception) for every rejected posting)
+        """
+        balance = self._balance_cents if self._balance_cents is not None else to_cents(self.get_balance())
+        day_counts, month_counts = {}, {}
+        rows, rejected = [], []
+        for i, (amt, posted) in enumerate(postings):
+            cents = to_cents(amt)
+            try:
+                if cents < 0 and balance < -cents:
+                    raise OverdrawError()
+                self._check_batch_limits(posted, day_counts, month_counts)
+                if latest_date is not None and posted < latest_date:
+                    raise TransactionSequenceError(latest_date)
+            except (OverdrawError, TransactionLimitError, TransactionSequenceError) as e:
+                rejected.append((i, e))
+                continue
+            balance += cents
+            latest_date = posted
+            day_counts[posted] = day_counts.get(posted, 0) + 1
+            month = posted.replace(day=1)
+            month_counts[month] = month_counts.get(month, 0) + 1
+            rows.append({"_amt_cents": cents, "_account_id": self._id, "_date": posted, "_exempt": False})
+        self._balance_cents = balance
+        return rows, rejected
+
+    def _check_batch_limits(self, date, day_counts, month_counts):
+        """Checks a posting against the account limits during a batch
+
+        Args:
+            date (Date): date of the posting
+            day_counts (dict): postings accepted so far in the batch by day
+            month_counts (dict): postings accepted so far in the batch by first day of the month
+        """
+        pass
 
 
     def _check_balance(self, t):
@@ -92,28 +186,87 @@ class Account(Base):
     def _check_limits(self, t):
         pass
 
+    def _query_transactions(self):
+        "Returns a query over this account's transactions, answered from the (account, date, exempt) index"
+        return object_session(self).query(Transaction).filter(Transaction.account == self)
+
+    def _count_transactions(self, start, end):
+        """Counts non-exempt transactions on this account dated from start up to, but not including, end
+
+        Returns:
+            int: number of matching transactions
+        """
+        return object_session(self).query(func.count()).select_from(Transaction).filter(
+            Transaction.account == self,
+            Transaction._date >= start,
+            Transaction._date < end,
+            Transaction._exempt == False).scalar()
+
+    def _latest_transaction(self):
+        "Returns the most recent transaction on this account, or None"
+        return self._query_transactions().order_by(Transaction._date.desc(), Transaction._id.desc()).first()
+
     def _check_date(self, t):
-        if len(self._transactions) > 0:
-            latest_transaction = max(self._transactions)
-            if t < latest_transaction:
-                raise TransactionSequenceError(latest_transaction.date)
+        latest_date = object_session(self).query(func.max(Transaction._date)).filter(
+            Transaction.account == self).scalar()
+        if latest_date is not None and t.date < latest_date:
+            raise TransactionSequenceError(latest_date)
 
     def get_balance(self):
-        """Gets the balance for an account by summing its transactions
+        """Gets the balance for an account from its running total
+
+        add_transaction updates the running total in the same unit of work that stores the
+        transaction, so the two are committed together. Bank.verify_balances reconciles the
+        totals against the ledger.
 
         Returns:
-            Decimal: current balance
+            Money: current balance
         """
-        # could have a balance variable updated when transactions are added (or removed) which is faster
-        # but this is more foolproof since it's always in sync with transactions
-        # this could be improved by caching the sum to avoid too much
-        # recalculation, while still maintaining the list as the ground truth
-        return sum(self._transactions)
+        if self._balance_cents is None:
+            # accounts stored without a running total fall back to the ledger once
+            self._balance = self.get_ledger_balance()
+        return self._balance
+
+    def get_ledger_balance(self):
+        """Gets the balance for an account by summing its transactions in the database
+
+        Returns:
+            Money: sum of all transaction amounts
+        """
+        session = object_session(self)
+        if session is None:
+            return sum(self._transactions, Money(0))
+        total = session.query(func.sum(Transaction._amt_cents)).filter(Transaction.account == self).scalar()
+        return from_cents(total or 0)
+
+    def balance_as_of(self, as_of):
+        """Gets the balance after every transaction dated on or before a date
+
+        The monthly totals checkpoint the balance at the end of each month with transactions, so this
+        is the closing balance of the latest month before as_of, found by a primary key seek, plus the
+        transactions of as_of's month up to as_of, found by an (account, date) index range.
+
+        Args:
+            as_of (Date): last date to include
+
+        Returns:
+            Money: balance at the end of that day
+        """
+        session = object_session(self)
+        start = month_start(as_of)
+        checkpoint = session.query(MonthlyStatement._closing_cents).filter(
+            MonthlyStatement._account_id == self._id,
+            MonthlyStatement._month < start).order_by(MonthlyStatement._month.desc()).limit(1).scalar()
+        partial = session.query(func.sum(Transaction._amt_cents)).filter(
+            Transaction.account == self,
+            Transaction._date >= start,
+            Transaction._date <= as_of).scalar()
+        return from_cents((checkpoint or 0) + (partial or 0))
 
     def _assess_interest(self, latest_transaction, session):
         """Calculates interest for an account balance and adds it as a new transaction exempt from limits.
         """
-        self.add_transaction(self.get_balance() * self._interest_rate, session, 
+        self.add_transaction(self.get_balance().times_rate(self._interest_rate), session, 
                         date=latest_transaction.last_day_of_month(), 
                         exempt=True)
 
@@ -127,12 +280,18 @@ class Account(Base):
             TransactionSequenceError: Indicates that the new transactions were
             not newer than the most recent interest or fees transactions
         """
-        latest_transaction = max(self._transactions)
-        for t in self._transactions:
-            if t.is_exempt() and t.in_same_month(latest_transaction):
-                # found an interest or fee transaction that is already in the
-                # same month as the most recent transaction
-                raise TransactionSequenceError(t.date)
+        latest_transaction = self._latest_transaction()
+        if latest_transaction is None:
+            raise ValueError("account has no transactions")
+        month_end = latest_transaction.last_day_of_month()
+        t = self._query_transactions().filter(
+            Transaction._exempt == True,
+            Transaction._date >= month_end.replace(day=1),
+            Transaction._date <= month_end).order_by(Transaction._date).first()
+        if t is not None:
+            # found an interest or fee transaction that is already in the
+            # same month as the most recent transaction
+            raise TransactionSequenceError(t.date)
         self._assess_interest(latest_transaction, session)
         self._assess_fees(latest_transaction, session)
 
@@ -144,7 +303,66 @@ class Account(Base):
 
     def get_transactions(self):
         "Returns sorted list of transactions on this account"
-        return sorted(self._transactions)
+        return list(self._transactions)
+
+    def iter_transactions(self, start=None, end=None, offset=0, limit=None):
+        """Yields transactions on this account in date order without loading the whole ledger
+
+        Args:
+            start (Date, optional): earliest date to include. Defaults to no bound.
+            end (Date, optional): latest date to include. Defaults to no bound.
+            offset (int, optional): number of matching transactions to skip. Defaults to 0.
+            limit (int, optional): maximum number of transactions to yield. Defaults to all.
+        """
+        query = self._transactions
+        if start is not None:
+            query = query.filter(Transaction._date >= start)
+        if end is not None:
+            query = query.filter(Transaction._date <= end)
+        return iter(query.offset(offset).limit(limit).yield_per(500))
+
+    def transaction_count(self):
+        "Returns the number of transactions on this account, added up from its monthly totals"
+        if self._id is None:
+            return 0
+        return object_session(self).query(func.sum(MonthlyStatement._count)).filter(
+            MonthlyStatement._account_id == self._id).scalar() or 0
+
+    def get_statement(self, year, month):
+        "Returns the MonthlyStatement of this account for one month"
+        first = date(year, month, 1)
+        return self.get_statements(first, first)[0]
+
+    def get_statements(self, start, end):
+        """Returns the monthly statements of this account from the month of start to the month of end
+
+        Statements are read from the monthly totals kept as transactions are posted, so no
+        transactions are loaded. Months without transactions get a statement carrying the balance.
+
+        Args:
+            start (Date): any day in the first month
+            end (Date): any day in the last month
+
+        Returns:
+            list: one MonthlyStatement per month, in order
+        """
+        start, end = month_start(start), month_start(end)
+        query = object_session(self).query(MonthlyStatement).filter(
+            MonthlyStatement._account_id == self._id).populate_existing()
+        stored = {s._month: s for s in query.filter(MonthlyStatement._month >= start, MonthlyStatement._month <= end)}
+        previous = query.filter(MonthlyStatement._month < start).order_by(MonthlyStatement._month.desc()).first()
+        balance = previous._closing_cents if previous is not None else 0
+
+        statements = []
+        month = start
+        while month <= end:
+            statement = stored.get(month)
+            if statement is None:
+                statement = MonthlyStatement(self._id, month, balance)
+            balance = statement._closing_cents
+            statements.append(statement)
+            month = next_month(month)
+        return statements
 
 
 class SavingsAccount(Account):
@@ -173,17 +391,32 @@ class SavingsAccount(Account):
             bool: true if within limits and false if beyond limits
         """
         # Count number of non-exempt transactions on the same day as t1
-        num_today = len(
-            [t2 for t2 in self._transactions if not t2.is_exempt() and t2.in_same_day(t1)])
+        num_today = self._count_transactions(t1.date, t1.date + timedelta(days=1))
         # Count number of non-exempt transactions in the same month as t1
-        num_this_month = len(
-            [t2 for t2 in self._transactions if not t2.is_exempt() and t2.in_same_month(t1)])
+        num_this_month = self._count_transactions(t1.date.replace(day=1),
+                                                  t1.last_day_of_month() + timedelta(days=1))
         # check counts against daily and monthly limits
         if num_today >= self._daily_limit:
             raise TransactionLimitError("day", self._daily_limit)
         if num_this_month >= self._monthly_limit:
             raise TransactionLimitError("month", self._monthly_limit)
 
+    def _check_batch_limits(self, date, day_counts, month_counts):
+        """Checks the daily and monthly limits during a batch, counting each day and month in the database once
+
+        The counters are seeded with the stored transactions the first time a day or month comes up
+        and add_transactions increments them for every accepted posting.
+        """
+        month = date.replace(day=1)
+        if date not in day_counts:
+            day_counts[date] = self._count_transactions(date, date + timedelta(days=1))
+        if month not in month_counts:
+            month_counts[month] = self._count_transactions(month, (month + timedelta(days=32)).replace(day=1))
+        if day_counts[date] >= self._daily_limit:
+            raise TransactionLimitError("day", self._daily_limit)
+        if month_counts[month] >= self._monthly_limit:
+            raise TransactionLimitError("month", self._monthly_limit)
+
     def __str__(self):
         """Formats the type, account number, and balance of the account.
         For example, 'Savings#000000001,<tab>balance: $50.00'
@@ -208,7 +441,7 @@ class CheckingAccount(Account):
         super().__init__(*args, **kwargs)
         self._interest_rate = Decimal("0.0008")
         self._balance_threshold = 100
-        self._low_balance_fee = Decimal("-5.44")
+        self._low_balance_fee = Money.parse("-5.44")
         self._type = "checking"
 
     def _assess_fees(self, latest_transaction, session):
@@ -0,0 +1,251 @@
+"""Replays every account's transactions and reports where the stored state or the history breaks the bank's rules.
+
+    python audit.py [bank.db] [--workers 4] [--partition-size 1000] [--checkpoint audit.checkpoint] [--report audit.jsonl]
+
+Accounts are split into partitions of consecutive ids. Each partition is replayed by a worker
+process over its own database connection, so the audit scales with the number of cores. For every
+account it checks:
+
+    balance        the running balance equals the sum of the transactions
+    statement      the monthly totals match the transactions of each month
+    sequence       every transaction is dated on or after the one posted before it
+    overdraft      no withdrawal was larger than the balance before it
+    daily_limit    no day has more transactions than the account's daily limit
+    monthly_limit  no month has more transactions than the account's monthly limit
+    month_end      each month has at most one interest and one fee posting, dated on its last day
+
+Exempt transactions (interest and fees) are only subject to the sequence and month_end checks.
+Every finished partition is saved to the checkpoint file; rerunning with the same checkpoint skips
+those partitions, so an interrupted audit carries on where it stopped. A checkpoint only applies to
+the database in the state it was audited in: one written before accounts, postings or balances
+changed is ignored. The checkpoint is removed once the audit is complete. Exits with status 1 when there are discrepancies.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import logconfig
+from datetime import date
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlalchemy import text
+
+from db import create_engine, load_settings
+from transactions import from_cents, last_day_of_month
+
+DEFAULT_PARTITION_SIZE = 1000
+DEFAULT_CHECKPOINT = "audit.checkpoint"
+
+ACCOUNTS = """SELECT _id, _account_number, _type, _balance_cents, _daily_limit, _monthly_limit
+              FROM account WHERE _id BETWEEN :first AND :last ORDER BY _id"""
+# in posting order, which is the order the rules were checked in
+TRANSACTIONS = """SELECT _account_id, _amt_cents, _date, _exempt FROM "transaction"
+                  WHERE _account_id BETWEEN :first AND :last ORDER BY _account_id, _id"""
+MONTHS = """SELECT _account_id, substr(_month, 1, 7), _opening_cents, _closing_cents, _deposits_cents,
+                   _withdrawals_cents, _interest_cents, _fees_cents, _count
+            FROM account_month WHERE _account_id BETWEEN :first AND :last"""
+# changes whenever an account is opened, a transaction is posted or a balance is repaired
+STATE = """SELECT (SELECT COUNT(*) FROM account), (SELECT MAX(_id) FROM "transaction"),
+                  (SELECT SUM(_balance_cents) FROM account)"""
+
+_engine = None  # the worker process's engine
+
+
+def _dollars(cents):
+    return f"-${from_cents(-cents):,.2f}" if cents < 0 else f"${from_cents(cents):,.2f}"
+
+
+def audit_account(label, account, transactions, months):
+    """Replays one account's transactions against its stored balance, monthly totals and rules
+
+    Args:
+        label (str): name of the account in the report
+        account (Row): the account's row from ACCOUNTS
+        transactions (list): the account's rows from TRANSACTIONS, in posting order
+        months (dict): the account's monthly totals from MONTHS, by YYYY-MM
+
+    Returns:
+        list: one dict per discrepancy, with the account, check, date (or None) and detail
+    """
+    discrepancies = []
+
+    def report(check, day, detail):
+        discrepancies.append({"account": label, "check": check, "date": day, "detail": detail})
+
+    _, _, _, balance_cents, daily_limit, monthly_limit = account
+    balance = 0
+    latest = None
+    day_counts, month_counts, interest_months, fee_months = Counter(), Counter(), set(), set()
+    replayed = {}
+    for _, cents, day, exempt in transactions:
+        month = day[:7]
+        if latest is not None and day < latest:
+            report("sequence", day, f"posted after a transaction dated {latest}")
+        if exempt:
+            postings = interest_months if cents >= 0 else fee_months
+            if month in postings:
+                report("month_end", day, f"second {'interest' if cents >= 0 else 'fee'} posting in {month}")
+            postings.add(month)
+            posted = date.fromisoformat(day)
+            if posted != last_day_of_month(posted.year, posted.month):
+                report("month_end", day, "interest or fee not posted on the last day of the month")
+        else:
+            if cents < 0 and balance < -cents:
+                report("overdraft", day, f"withdrawal of {_dollars(-cents)} from a balance of {_dollars(balance)}")
+            day_counts[day] += 1
+            month_counts[month] += 1
+            if daily_limit is not None and day_counts[day] == daily_limit + 1:
+                report("daily_limit", day, f"more than {daily_limit} transactions in the day")
+            if monthly_limit is not None and month_counts[month] == monthly_limit + 1:
+                report("monthly_limit", day, f"more than {monthly_limit} transactions in {month}")
+
+        totals = replayed.get(month)
+        if totals is None:
+            totals = replayed[month] = [balance, balance, 0, 0, 0, 0, 0]
+        totals[2 + (0 if cents >= 0 else 1) + (2 if exempt else 0)] += cents
+        totals[6] += 1
+        balance += cents
+        totals[1] = balance
+        latest = max(latest, day) if latest is not None else day
+
+    if balance_cents != balance:
+        report("balance", None, f"running balance {_dollars(balance_cents or 0)}, transactions sum to {_dollars(balance)}")
+    for month in sorted(replayed.keys() | months.keys()):
+        stored, expected = months.get(month), replayed.get(month)
+        if stored is None:
+            report("statement", month, "no monthly totals for a month with transactions")
+        elif expected is None:
+            report("statement", month, "monthly totals for a month without transactions")
+        elif list(stored) != expected:
+            report("statement", month, f"stored opening, closing, deposits, withdrawals, interest, fees, count "
+                                       f"{list(stored)}, transactions give {expected}")
+    return discrepancies
+
+
+def _start_worker(path):
+    global _engine
+    _engine = create_engine(path)
+
+
+def audit_partition(first, last):
+    """Audits the accounts with ids from first to last, reading them in three range queries
+
+    Returns:
+        list: the discrepancies found, as audit_account reports them
+    """
+    params = {"first": first, "last": last}
+    with _engine.connect() as connection:
+        accounts = connection.execute(text(ACCOUNTS), params).all()
+        transactions = {}
+        for row in connection.execute(text(TRANSACTIONS), params):
+            transactions.setdefault(row[0], []).append(row)
+        months = {}
+        for row in connection.execute(text(MONTHS), params):
+            months.setdefault(row[0], {})[row[1]] = row[2:]
+
+    discrepancies = []
+    for account in accounts:
+        label = f"{(account[2] or 'account').capitalize()}#{account[1]:09}"
+        discrepancies.extend(audit_account(label, account, transactions.get(account[0], []),
+                                           months.get(account[0], {})))
+    return discrepancies
+
+
+def partitions(engine, size):
+    "Splits the account ids into (first, last) ranges of at most size accounts"
+    with engine.connect() as connection:
+        ids = connection.execute(text("SELECT _id FROM account ORDER BY _id")).scalars().all()
+    return [(ids[i], ids[min(i + size, len(ids)) - 1]) for i in range(0, len(ids), size)]
+
+
+def database_state(engine):
+    "Returns the number of accounts, the highest transaction id and the sum of the balances"
+    with engine.connect() as connection:
+        return list(connection.execute(text(STATE)).one())
+
+
+def _load_checkpoint(path, source):
+    "Returns the discrepancies of the partitions finished by an earlier run on the same database state, by partition"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != source:
+        logging.debug("Ignoring checkpoint %s of another database or state", path)
+        return {}
+    return checkpoint["partitions"]
+
+
+def _save_checkpoint(path, source, finished):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"source": source, "partitions": finished}, f)
+    os.replace(temp_path, path)
+
+
+def run_audit(path=None, workers=None, partition_size=DEFAULT_PARTITION_SIZE, checkpoint=DEFAULT_CHECKPOINT):
+    """Audits every account of the database across a pool of worker processes.
+
+    Args:
+        path (str, optional): database file. Defaults to the configured one.
+        workers (int, optional): worker processes. Defaults to the number of CPUs.
+        partition_size (int, optional): accounts per partition. Defaults to DEFAULT_PARTITION_SIZE.
+        checkpoint (str, optional): checkpoint file, or None to neither resume nor save progress
+
+    Returns:
+        dict: the discrepancies, and the number of partitions audited and resumed
+    """
+    database = os.path.abspath(load_settings(path)["path"])
+    engine = create_engine(database)
+    ranges = partitions(engine, partition_size)
+    # a checkpoint only applies to the same database in the same state
+    source = [database, *database_state(engine)]
+    engine.dispose()
+
+    finished = _load_checkpoint(checkpoint, source) if checkpoint else {}
+    resumed = sum(1 for first, last in ranges if f"{first}-{last}" in finished)
+    pending = [(first, last) for first, last in ranges if f"{first}-{last}" not in finished]
+    if pending:
+        with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(database,)) as pool:
+            futures = {pool.submit(audit_partition, first, last): f"{first}-{last}" for first, last in pending}
+            for future in as_completed(futures):
+                finished[futures[future]] = future.result()
+                if checkpoint:
+                    _save_checkpoint(checkpoint, source, finished)
+
+    discrepancies = [d for first, last in ranges for d in finished[f"{first}-{last}"]]
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    logging.debug("Audited %s partitions of %s (%s resumed): %s discrepancies",
+                  len(ranges), database, resumed, len(discrepancies))
+    return {"discrepancies": discrepancies, "partitions": len(ranges), "resumed": resumed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay every account's transactions and report discrepancies")
+    parser.add_argument("path", nargs="?", help="database file. Defaults to the configured one")
+    parser.add_argument("--workers", type=int, help="worker processes. Defaults to the number of CPUs")
+    parser.add_argument("--partition-size", type=int, default=DEFAULT_PARTITION_SIZE)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT,
+                        help="file that progress is saved to and resumed from")
+    parser.add_argument("--report", help="also write the discrepancies to this file as JSON lines")
+    args = parser.parse_args(argv)
+
+    logconfig.configure('bank.log')
+    result = run_audit(args.path, args.workers, args.partition_size, args.checkpoint)
+    discrepancies = result["discrepancies"]
+    for d in discrepancies:
+        print(f"{d['account']}: {d['check']}{' on ' + d['date'] if d['date'] else ''}: {d['detail']}")
+    if args.report:
+        with open(args.report, "w") as f:
+            for d in discrepancies:
+                f.write(json.dumps(d) + "\n")
+    resumed = f" ({result['resumed']} resumed from the checkpoint)" if result["resumed"] else ""
+    print(f"{len(discrepancies)} discrepancies in {result['partitions']} partitions{resumed}.")
+    return 1 if discrepancies else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,27 +1,77 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine, func, update, insert, text
 from sqlalchemy.orm import relationship, backref, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
-from datetime import datetime
+from datetime import datetime, date
 import functools
+import logging
 
 Base = declarative_base()
 
-from accounts import SavingsAccount, CheckingAccount, Base
+from accounts import Account, SavingsAccount, CheckingAccount, Base
+from transactions import Transaction, from_cents, last_day_of_month
+from statements import month_deltas, record_months, rebuild_months
 
 SAVINGS = "savings"
 CHECKING = "checking"
+LOOKUP_CHUNK = 500  # account numbers per IN (...) lookup, well under SQLite's variable limit
+RATE_SCALE = 100000000  # interest rates are multiplied by this to compute interest in integer arithmetic
+
+# Statements of the month-end job, run in order in one transaction. The postings are computed into
+# a temporary table first, because inserting them changes which accounts the rules select.
+MONTH_END = [
+    """CREATE TEMP TABLE IF NOT EXISTS month_end_posting (
+           account_id INTEGER PRIMARY KEY, interest_cents INTEGER NOT NULL, fee_cents INTEGER)""",
+    "DELETE FROM month_end_posting",
+    # interest is the balance times the rate, rounded half up to cents like to_cents. Accounts
+    # qualify when their latest transaction is on or before the month end and they have no interest
+    # or fee posting in the month yet; both are answered from the (account, date, exempt) index
+    f"""INSERT INTO month_end_posting (account_id, interest_cents, fee_cents)
+        SELECT _id, interest,
+               CASE WHEN _low_balance_fee_cents IS NOT NULL AND _balance_cents + interest < _balance_threshold_cents
+                    THEN _low_balance_fee_cents END
+        FROM (SELECT a._id, a._balance_cents, a._balance_threshold_cents, a._low_balance_fee_cents,
+                     CASE WHEN a._balance_cents >= 0
+                          THEN (a._balance_cents * rate + {RATE_SCALE // 2}) / {RATE_SCALE}
+                          ELSE -((-a._balance_cents * rate + {RATE_SCALE // 2}) / {RATE_SCALE}) END AS interest
+              FROM (SELECT account.*, CAST(ROUND(COALESCE(_interest_rate, 0) * {RATE_SCALE}) AS INTEGER) AS rate
+                    FROM account WHERE _bank_id = :bank_id) AS a
+              WHERE (SELECT MAX(t._date) FROM "transaction" t WHERE t._account_id = a._id) <= :month_end
+                AND NOT EXISTS (SELECT 1 FROM "transaction" t
+                                WHERE t._account_id = a._id AND t._date BETWEEN :month_start AND :month_end
+                                  AND t._exempt = 1))""",
+    """INSERT INTO "transaction" (_amt_cents, _account_id, _date, _exempt)
+       SELECT interest_cents, account_id, :month_end, 1 FROM month_end_posting ORDER BY account_id""",
+    """INSERT INTO "transaction" (_amt_cents, _account_id, _date, _exempt)
+       SELECT fee_cents, account_id, :month_end, 1 FROM month_end_posting
+       WHERE fee_cents IS NOT NULL ORDER BY account_id""",
+    """UPDATE account SET _balance_cents = _balance_cents + (
+           SELECT interest_cents + COALESCE(fee_cents, 0) FROM month_end_posting WHERE account_id = account._id)
+       WHERE _id IN (SELECT account_id FROM month_end_posting)""",
+    # adds the postings to the monthly totals, as statements.RECORD_MONTH does for other postings
+    """INSERT INTO account_month (_account_id, _month, _opening_cents, _closing_cents, _deposits_cents,
+                                  _withdrawals_cents, _interest_cents, _fees_cents, _count)
+       SELECT p.account_id, :month_start, a._balance_cents - p.interest_cents - COALESCE(p.fee_cents, 0),
+              a._balance_cents, 0, 0, p.interest_cents, COALESCE(p.fee_cents, 0), 1 + (p.fee_cents IS NOT NULL)
+       FROM month_end_posting p JOIN account a ON a._id = p.account_id
+       WHERE true
+       ON CONFLICT (_account_id, _month) DO UPDATE SET
+           _closing_cents = excluded._closing_cents,
+           _interest_cents = _interest_cents + excluded._interest_cents,
+           _fees_cents = _fees_cents + excluded._fees_cents,
+           _count = _count + excluded._count""",
+]
 
 class Bank(Base):
     __tablename__ = "bank"
 
     _id = Column(Integer, primary_key=True) # a unique id for each bank (even if you only have one)
+    _next_account_number = Column(Integer, nullable=False, default=1)  # sequence for new account numbers
     
     
     # Relationships
-    _accounts = relationship("Account", backref="bank")  # One-to-many relationship with Account
-
-    
+    # One-to-many relationship with Account, queried on demand instead of loaded as a whole
+    _accounts = relationship("Account", backref="bank", lazy="dynamic", order_by="Account._account_number")
 
     def add_account(self, acct_type, session):
         """Creates a new Account object and adds it to this bank object. The Account will be a SavingsAccount or CheckingAccount, depending on the type given.
@@ -29,23 +79,68 @@ class Bank(Base):
         Args:
             type (string): "Savings" or "Checking" to indicate the type of account to create
         """
-        acct_num = self._generate_account_number()
-        if acct_type == SAVINGS:
-            a = SavingsAccount(acct_num)  # associate account with the bank
-        elif acct_type == CHECKING:
-            a = CheckingAccount(acct_num) # associate account with the bank
-        else:
+        if acct_type not in (SAVINGS, CHECKING):
             return None
-        self._accounts.append(a)
-        session.add(a)  # add account to session for saving to database
+        self._open_accounts(acct_type, self._reserve_account_numbers(session, 1), session)
         session.commit()  # commit changes to database
 
-    def _generate_account_number(self):
-        return len(self._accounts) + 1  # use the length of the accounts list to generate account number
+    def add_accounts(self, acct_type, count, session):
+        """Creates count accounts of the given type with one block of account numbers and a single commit.
+
+        Args:
+            type (string): "Savings" or "Checking" to indicate the type of accounts to create
+            count (int): number of accounts to create
+
+        Returns:
+            list: the new accounts
+        """
+        if acct_type not in (SAVINGS, CHECKING) or count < 1:
+            return []
+        accounts = self._open_accounts(acct_type, self._reserve_account_numbers(session, count), session)
+        session.commit()
+        return accounts
+
+    def _open_accounts(self, acct_type, numbers, session):
+        account_class = SavingsAccount if acct_type == SAVINGS else CheckingAccount
+        accounts = [account_class(acct_num) for acct_num in numbers]
+        for a in accounts:
+            self._accounts.append(a)  # associate account with the bank
+        session.add_all(accounts)  # add accounts to session for saving to database
+        return accounts
+
+    def _reserve_account_numbers(self, session, count):
+        """Takes the next count account numbers from this bank's sequence.
+
+        The increment is a single UPDATE, so it holds the database write lock until the caller
+        commits and two processes never receive the same numbers. The unique (bank, account number)
+        index rejects a duplicate should one slip through anyway.
+
+        Returns:
+            range: the reserved account numbers
+        """
+        session.flush()  # the bank row has to exist before its sequence can advance
+        session.execute(update(Bank).where(Bank._id == self._id)
+                        .values(_next_account_number=Bank._next_account_number + count)
+                        .execution_options(synchronize_session=False))
+        session.expire(self, ["_next_account_number"])
+        end = self._next_account_number  # read back inside the same transaction
+        return range(end - count, end)
+
+    def show_accounts(self, offset=0, limit=None):
+        """Accessor method to return accounts in account number order
+
+        Args:
+            offset (int, optional): number of accounts to skip. Defaults to 0.
+            limit (int, optional): maximum number of accounts to return. Defaults to all.
+
+        Returns:
+            list: one page of accounts
+        """
+        return self._accounts.offset(offset).limit(limit).all()
 
-    def show_accounts(self):
-        "Accessor method to return accounts"
-        return self._accounts
+    def count_accounts(self):
+        "Returns the number of accounts without loading them"
+        return self._accounts.count()
 
     def get_account(self, account_num):
         """Fetches an account by its account number.
@@ -56,10 +151,115 @@ class Bank(Base):
         Returns:
             Account: matching account or None if not found
         """        
-        for x in self._accounts:
-            if x._account_number == account_num:
-                return x
-        return None
+        # served by the unique (bank, account number) index; loaded accounts come from the identity map
+        return self._accounts.filter_by(_account_number=account_num).first()
 
+    def add_transactions(self, postings, session):
+        """Checks and adds transactions for many accounts with one bulk insert.
 
+        Each account's postings are checked in their original order as Account.add_transactions
+        does, the accounts are looked up in a few IN queries, and the running balances are written
+        back in one batched UPDATE when the session flushes. Nothing is committed.
 
+        Args:
+            postings (iterable): (account number, amount, date) triples
+            session (Session): session the bank was loaded with
+
+        Returns:
+            list: (index in postings, exception) for every rejected posting
+        """
+        by_account = {}  # account number: [(index, amount, date)]
+        for i, (acct_num, amt, posted) in enumerate(postings):
+            by_account.setdefault(acct_num, []).append((i, amt, posted))
+
+        session.flush()  # pending transactions count toward the state read below
+        numbers = list(by_account)
+        accounts, latest_dates = {}, {}
+        for i in range(0, len(numbers), LOOKUP_CHUNK):
+            chunk = self._accounts.filter(Account._account_number.in_(numbers[i:i + LOOKUP_CHUNK])).all()
+            accounts.update((a._account_number, a) for a in chunk)
+            latest_dates.update(session.query(Transaction._account_id, func.max(Transaction._date))
+                                .filter(Transaction._account_id.in_([a._id for a in chunk]))
+                                .group_by(Transaction._account_id))
+
+        rows, rejected, deltas = [], [], []
+        # balances changed by earlier accounts are flushed together at the end, not before each limit count
+        with session.no_autoflush:
+            for acct_num, account_postings in by_account.items():
+                account = accounts.get(acct_num)
+                if account is None:
+                    rejected.extend((i, ValueError(f"no account #{acct_num:09}")) for i, _, _ in account_postings)
+                    continue
+                account_rows, account_rejected = account._check_postings(
+                    [(amt, posted) for _, amt, posted in account_postings], latest_dates.get(account._id))
+                rows.extend(account_rows)
+                opening = account._balance_cents - sum(row["_amt_cents"] for row in account_rows)
+                deltas.extend(month_deltas(account._id, opening, account_rows))
+                rejected.extend((account_postings[j][0], e) for j, e in account_rejected)
+        if rows:
+            session.execute(insert(Transaction.__table__), rows)
+            record_months(session, deltas)
+        return rejected
+
+    def run_month_end(self, session, year, month):
+        """Applies interest to every account of this bank, and the low balance fee where it is due, for the given month.
+
+        Does the same as calling assess_interest_and_fees on each account, with a few set-based
+        statements instead of a pass over the accounts in Python, and commits once. Interest and
+        fees are posted as exempt transactions on the last day of the month. Accounts with no
+        transactions, with transactions after the month end, or with interest or fees already
+        posted in that month are skipped.
+
+        Args:
+            session (Session): session the bank was loaded with
+            year (int): year of the month to close
+            month (int): month to close, 1-12
+
+        Returns:
+            dict: number of accounts credited with interest, number charged a fee, and the totals posted
+        """
+        session.flush()  # pending postings count toward the balances and rules
+        params = {"bank_id": self._id, "month_start": date(year, month, 1).isoformat(),
+                  "month_end": last_day_of_month(year, month).isoformat()}
+        try:
+            for statement in MONTH_END:
+                session.execute(text(statement), params)
+            accounts, fees, interest_cents, fee_cents = session.execute(text(
+                "SELECT COUNT(*), COUNT(fee_cents), COALESCE(SUM(interest_cents), 0), COALESCE(SUM(fee_cents), 0) "
+                "FROM month_end_posting")).one()
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        # the statements bypassed the ORM, so loaded accounts have to reload their running totals
+        session.expire_all()
+        logging.debug("Month end %s-%02d: interest for %s accounts, fees for %s", year, month, accounts, fees,
+                      extra={"event": "month_end", "month": f"{year}-{month:02}", "interest_accounts": accounts,
+                             "fee_accounts": fees, "interest": from_cents(interest_cents), "fees": from_cents(fee_cents)})
+        return {"accounts": accounts, "fees": fees,
+                "interest": from_cents(interest_cents), "fee_total": from_cents(fee_cents)}
+
+    def verify_balances(self, session, repair=False):
+        """Reconciles the running balance of every account against the sum of its transactions.
+
+        Args:
+            session (Session): session the bank was loaded with
+            repair (bool, optional): overwrite mismatched running balances with the ledger sum, and
+                recompute the monthly statements from the transactions. Defaults to False.
+
+        Returns:
+            list: (account, running balance, ledger sum) for every account whose balances differ
+        """
+        ledger_sums = dict(session.query(Transaction._account_id, func.sum(Transaction._amt_cents))
+                           .group_by(Transaction._account_id))
+        mismatches = []
+        for a in self._accounts.yield_per(500):
+            ledger = ledger_sums.get(a._id) or 0
+            if a._balance_cents != ledger:
+                mismatches.append((a, a._balance, from_cents(ledger)))
+                if repair:
+                    a._balance_cents = ledger
+        if repair and mismatches:
+            rebuild_months(session)
+            session.commit()
+        return mismatches
\ No newline at end of file
@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from bank import Bank, Base, SAVINGS, CHECKING
+from db import create_engine
+from money import Money
+from exceptions import OverdrawError, TransactionLimitError, TransactionSequenceError
+
+START = date(2000, 1, 1)
+COMMIT_EVERY = 1000
+
+
+def stats(samples, operations=None):
+    """Summarizes per-operation timings in seconds as throughput and p50/p99 latency in microseconds"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    operations = operations or len(ordered)
+    return {
+        "operations": operations,
+        "seconds": total,
+        "per_second": operations / total if total else 0.0,
+        "p50_us": ordered[len(ordered) // 2] * 1e6 if ordered else 0.0,
+        "p99_us": ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)] * 1e6 if ordered else 0.0,
+    }
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _post_all(session, accounts, transactions):
+    """Posts transactions round-robin over accounts, one day per round, committing every COMMIT_EVERY postings"""
+    samples = []
+    rejected = 0
+    clock = time.perf_counter
+    for k in range(transactions):
+        account = accounts[k % len(accounts)]
+        day = START + timedelta(days=k // len(accounts))
+        start = clock()
+        try:
+            account.add_transaction(Money.of(100 if k < len(accounts) else 1), session, day)
+        except (OverdrawError, TransactionLimitError, TransactionSequenceError):
+            rejected += 1
+        if k % COMMIT_EVERY == COMMIT_EVERY - 1:
+            session.commit()
+        samples.append(clock() - start)
+    session.commit()
+    return samples, rejected
+
+
+def run(transactions, accounts, path, preset=None):
+    """Runs every workload against a fresh SQLite database of the given size and returns the results by workload"""
+    engine = create_engine(path, preset)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    bank = Bank()
+    session.add(bank)
+    session.commit()
+    results = {}
+
+    checking = bank.add_accounts(CHECKING, max(1, accounts // 2), session)
+    savings = bank.add_accounts(SAVINGS, max(1, accounts - len(checking)), session)
+
+    samples, _ = _post_all(session, checking, transactions)
+    results["posting"] = stats(samples)
+
+    # savings accounts take one posting per day, so most of each month is rejected by the limits
+    samples, rejected = _post_all(session, savings, max(len(savings), transactions // 10))
+    results["limit_checks"] = stats(samples)
+    results["limit_checks"]["rejected"] = rejected
+
+    busiest = checking[0]
+    count = len(busiest.get_transactions())
+    page = max(1, count // 100)
+    samples = [_timed(lambda o: list(busiest.iter_transactions(offset=o, limit=page)), offset)
+               for offset in range(0, count, page)]
+    results["listing_page"] = stats(samples)
+    results["listing_full"] = stats([_timed(lambda: list(busiest.iter_transactions()))])
+
+    # about a hundred days spread over the busiest account's history
+    days = transactions // len(checking) + 1
+    results["balance_as_of"] = stats([_timed(busiest.balance_as_of, START + timedelta(days=day))
+                                      for day in range(0, days, max(1, days // 100))])
+
+    results["summary"] = stats([_timed(lambda: [str(a) for a in bank.show_accounts()])], accounts)
+
+    last = busiest._latest_transaction().date
+    results["month_end"] = stats([_timed(bank.run_month_end, session, last.year, last.month)], accounts)
+
+    # dated past the month-end postings of the latest month
+    first_day = START + timedelta(days=transactions // len(checking) + 32)
+    batch = [(checking[k % len(checking)]._account_number, Money.of(1),
+              first_day + timedelta(days=k // len(checking))) for k in range(transactions)]
+
+    def batch_posting():
+        bank.add_transactions(batch, session)
+        session.commit()
+
+    results["batch_posting"] = stats([_timed(batch_posting)], transactions)
+
+    session.close()
+    engine.dispose()
+
+    def load():
+        load_engine = create_engine(path, preset)
+        load_session = sessionmaker(bind=load_engine)()
+        loaded = load_session.query(Bank).first()
+        for a in loaded.show_accounts():
+            str(a)
+        load_session.close()
+        load_engine.dispose()
+
+    results["load"] = stats([_timed(load)])
+    return results
+
+
+def compare(results, baseline):
+    """Prints the throughput change of every workload present in both result sets"""
+    for key, result in results.items():
+        old = baseline.get(key)
+        if not old or not old["per_second"]:
+            continue
+        change = (result["per_second"] / old["per_second"] - 1) * 100
+        print(f"{key:<40} {old['per_second']:>14,.0f} -> {result['per_second']:>14,.0f} ops/s ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SQL bank engine against a temporary SQLite database")
+    parser.add_argument("--transactions", type=int, nargs="+", default=[1_000],
+                        help="number of postings per run, e.g. 1000 100000 1000000")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[100],
+                        help="number of accounts per run, e.g. 100 10000 100000")
+    parser.add_argument("--preset", help="database preset from db.PRESETS. Defaults to the configured one")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare throughput against results saved by an earlier run")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for transactions in args.transactions:
+        for accounts in args.accounts:
+            with tempfile.TemporaryDirectory() as directory:
+                workloads = run(transactions, accounts, os.path.join(directory, "bank.db"), args.preset)
+            for workload, result in workloads.items():
+                key = f"sql/{workload}/{transactions}tx/{accounts}acct"
+                results[key] = result
+                print(f"{key:<40} {result['per_second']:>14,.0f} ops/s  "
+                      f"p50 {result['p50_us']:>10,.1f} us  p99 {result['p99_us']:>10,.1f} us")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,7 +1,7 @@
 import sys
 import pickle
 import logging
-from decimal import Decimal, setcontext, BasicContext, InvalidOperation
+import logconfig
 from datetime import datetime
 
 from bank import Bank
@@ -10,16 +10,12 @@ from exceptions import OverdrawError, TransactionLimitError, TransactionSequence
 import sqlalchemy
 from sqlalchemy.orm.session import sessionmaker
 
-from sqlalchemy import create_engine
-from bank import Base
+from migrate import upgrade
+from db import create_engine
+from money import Money
 
 
-
-# context with ROUND_HALF_UP
-setcontext(BasicContext)
-
-logging.basicConfig(filename='bank.log', level=logging.DEBUG,
-                    format='%(asctime)s|%(levelname)s|%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logconfig.configure('bank.log')
 
 class BankCLI():
     """Driver class for a command-line REPL interface to the Bank application"""
@@ -90,8 +86,8 @@ Enter command
         amount = None
         while amount is None:
             try:
-                amount = Decimal(input("Amount?\n>"))
-            except InvalidOperation:
+                amount = Money.parse(input("Amount?\n>"))
+            except ValueError:
                 print("Please try again with a valid dollar amount.")
 
         date = None
@@ -135,7 +131,8 @@ Enter command
     def _monthly_triggers(self):
         try:
             self._selected_account.assess_interest_and_fees(self._session)
-            logging.debug("Triggered interest and fees")
+            logging.debug("Triggered interest and fees", extra={
+                "event": "interest_and_fees", "account_number": self._selected_account._account_number})
             logging.debug("Saved to bank.db")
         except AttributeError:
             print("This command requires that you first select an account.")
@@ -145,22 +142,79 @@ Enter command
 
     def _list_transactions(self):
         try:
-            for t in self._selected_account.get_transactions():
+            for t in self._selected_account.iter_transactions():
                 print(t)
         except AttributeError:
             print("This command requires that you first select an account.")
 
 
+def verify_balances(repair):
+    """Prints every account whose running balance does not match its transactions, optionally repairing it"""
+    session = Session()
+    bank = session.query(Bank).first()
+    mismatches = bank.verify_balances(session, repair=repair) if bank else []
+    for account, stored, ledger in mismatches:
+        print(f"{account._type.capitalize()}#{account._account_number:09}: running balance {stored}, transactions sum to {ledger}")
+    print(f"{len(mismatches)} mismatched balances{' repaired' if repair and mismatches else ''}.")
+    logging.debug("Verified balances: %s mismatched", len(mismatches))
+    session.close()
+
+
+def month_end(month):
+    "Applies interest and fees to every account for a month given as YYYY-MM"
+    try:
+        closing = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        print("Please give the month in the format YYYY-MM.")
+        return
+    session = Session()
+    bank = session.query(Bank).first()
+    if bank:
+        result = bank.run_month_end(session, closing.year, closing.month)
+        print(f"Interest of ${result['interest']:,.2f} posted to {result['accounts']} accounts, "
+              f"fees of ${-result['fee_total']:,.2f} charged to {result['fees']}.")
+    session.close()
+
+
+def statements(arguments):
+    "Prints the monthly statements of an account, given its number, a first month and optionally a last month as YYYY-MM"
+    try:
+        number = int(arguments[0])
+        start = datetime.strptime(arguments[1], "%Y-%m").date()
+        end = datetime.strptime(arguments[2], "%Y-%m").date() if len(arguments) > 2 else start
+    except (IndexError, ValueError):
+        print("Please give an account number and the months in the format YYYY-MM.")
+        return
+    session = Session()
+    bank = session.query(Bank).first()
+    account = bank.get_account(number) if bank else None
+    if account is None:
+        print(f"There is no account #{number:09}.")
+    else:
+        for statement in account.get_statements(start, end):
+            print(statement)
+    session.close()
+
+
 if __name__ == "__main__":
     try:
-        engine = create_engine(f"sqlite:///bank.db")
+        engine = create_engine()
         # Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
+        upgrade(engine)
         Session = sqlalchemy.orm.sessionmaker(bind=engine)
-        BankCLI().run()
+        if "--verify-balances" in sys.argv:
+            verify_balances(repair="--repair" in sys.argv)
+        elif "--month-end" in sys.argv:
+            position = sys.argv.index("--month-end") + 1
+            month_end(sys.argv[position] if position < len(sys.argv) else "")
+        elif "--statement" in sys.argv:
+            position = sys.argv.index("--statement") + 1
+            statements(sys.argv[position:position + 3])
+        else:
+            BankCLI().run()
 
     except Exception as e:
         print("Sorry! Something unexpected happened. Check the logs or contact the developer for assistance.")
-        logging.error(str(e.__class__.__name__) + ": " + repr(str(e)))
+        logging.error("%s: %r", e.__class__.__name__, str(e))
 
 
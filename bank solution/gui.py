@@ -1,28 +1,28 @@
 import sys
 import logging
-from decimal import Decimal, InvalidOperation
+import logconfig
+from money import Money
 from datetime import datetime
 import tkinter as tk
 from tkinter import DISABLED, messagebox
 from tkinter import ttk
 from tkcalendar import DateEntry
 from pmw import ListBox
-from transactions import Base
+from migrate import upgrade
+from db import create_engine
 from bank import Bank
 
-import sqlalchemy
 from sqlalchemy.orm.session import sessionmaker
 from accounts import OverdrawError, TransactionLimitError, TransactionSequenceError
 
 
 
-logging.basicConfig(filename='bank.log', level=logging.DEBUG,
-                    format='%(asctime)s|%(levelname)s|%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+logconfig.configure('bank.log')
 
 
 def handle_exception(exception, value, traceback):
     print("Sorry! Something unexpected happened. If this problem persists please contact our support team for assistance.")
-    logging.error(f"{exception.__name__}: {repr(value)}")
+    logging.error("%s: %r", exception.__name__, value)
     sys.exit(0)
 
 
@@ -46,7 +46,6 @@ class BankGUI:
             logging.debug("Saved to bank.db") 
         self._selected_account = None
         self._all_accounts = []
-        self._all_transactions = []
 
     def setup_gui_elements(self):
         """Setup all the GUI elements like the main window, options, account frames, etc."""
@@ -99,7 +98,7 @@ class BankGUI:
     def initialize_transaction_widgets(self):
         """Initialize the widgets related to transactions."""
         self._list_transactions_frame.tkraise()
-        self._transaction_listbox = ListBox(self._list_transactions_frame, self._all_transactions)
+        self._transaction_listbox = ListBox(self._list_transactions_frame)
 
     def make_options(self):
         """Create the options frame with buttons for add account, add transaction, and interest and fees."""
@@ -141,8 +140,8 @@ class BankGUI:
         # Check validity of amount
         def validation_check():
             try:
-                amount = Decimal(e1.get())
-            except InvalidOperation:
+                amount = Money.parse(e1.get())
+            except ValueError:
                 messagebox.showwarning('Invalid Amount', 'Please try again with a valid dollar amount.')
             else:
                 add_callback(amount)
@@ -261,13 +260,11 @@ class BankGUI:
         self._list_transactions()
 
     def _list_transactions(self):
-        """List transactions for the selected account."""
-
-        self._transaction_listbox.destroyer()
-
-        t = self._selected_account.get_transactions()
+        """List transactions for the selected account, fetching only the pages that are scrolled to."""
+        account = self._selected_account
         self._list_transactions_frame.tkraise()
-        self._transaction_listbox = ListBox(self._list_transactions_frame, t)
+        self._transaction_listbox.show(account.transaction_count(),
+                                       lambda offset, limit: account.iter_transactions(offset=offset, limit=limit))
 
     
     def _monthly_triggers(self):
@@ -275,7 +272,8 @@ class BankGUI:
         try:
             self._selected_account.assess_interest_and_fees(self._session)
             self._session.commit()
-            logging.debug("Triggered fees and interest")
+            logging.debug("Triggered fees and interest", extra={
+                "event": "interest_and_fees", "account_number": self._selected_account._account_number})
             logging.debug("Saved to bank.db")
         except AttributeError:
             messagebox.showwarning('Account not selected', 'This command requires that you first select an account.')
@@ -305,8 +303,8 @@ class BankGUI:
 
 if __name__ == "__main__":
 
-    engine = sqlalchemy.create_engine("sqlite:///bank.db")
-    Base.metadata.create_all(engine)
+    engine = create_engine()
+    upgrade(engine)
     Session = sessionmaker()
     Session.configure(bind=engine)
     BankGUI()
@@ -0,0 +1,149 @@
+"""Load test for service.py: many keep-alive clients posting transactions and reading accounts at once.
+
+    python loadtest.py --requests 20000 --connections 64 --accounts 200
+    python loadtest.py --url http://127.0.0.1:8080
+
+Without --url a service is started on a temporary database and stopped afterwards.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from urllib.parse import urlsplit
+
+DATE = "2024-01-01"
+READ_EVERY = 4  # every fourth request reads an account instead of posting to it
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port):
+        self._host = host
+        self._port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method, path, payload=None):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self._writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self._host}\r\n"
+                           f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self._reader.readexactly(length))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+async def _worker(client, numbers, requests, samples, statuses):
+    clock = time.perf_counter
+    for k in requests:
+        number = numbers[k % len(numbers)]
+        start = clock()
+        if k % READ_EVERY == READ_EVERY - 1:
+            status, _ = await client.request("GET", f"/accounts/{number}")
+        else:
+            status, _ = await client.request("POST", f"/accounts/{number}/transactions",
+                                             {"amount": "1.00", "date": DATE})
+        samples.append(clock() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+async def run(host, port, requests, connections, accounts):
+    """Opens the accounts, then sends requests spread over the connections and returns the results"""
+    setup = Client(host, port)
+    numbers = []
+    for _ in range(accounts):
+        _, account = await setup.request("POST", "/accounts", {"type": "checking"})
+        numbers.append(account["number"])
+    await setup.close()
+
+    clients = [Client(host, port) for _ in range(connections)]
+    samples, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(_worker(client, numbers, range(i, requests, connections), samples, statuses)
+                           for i, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+
+    samples.sort()
+    return {
+        "requests": requests,
+        "seconds": elapsed,
+        "per_second": requests / elapsed,
+        "p50_ms": samples[len(samples) // 2] * 1e3,
+        "p99_ms": samples[min(len(samples) - 1, len(samples) * 99 // 100)] * 1e3,
+        "statuses": statuses,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_service(directory, port):
+    env = dict(os.environ, BANK_DB_PATH=os.path.join(directory, "bank.db"))
+    service_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py")
+    service = subprocess.Popen([sys.executable, service_path, "--port", str(port)], cwd=directory, env=env)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return service
+        except OSError:
+            time.sleep(0.05)
+    service.kill()
+    raise RuntimeError("service did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the bank HTTP service")
+    parser.add_argument("--url", help="service to test. Defaults to a service started on a temporary database")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--accounts", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        service = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = "127.0.0.1", _free_port()
+            service = _start_service(directory, port)
+        try:
+            result = asyncio.run(run(host, port, args.requests, args.connections, args.accounts))
+        finally:
+            if service is not None:
+                service.terminate()
+                service.wait()
+
+    print(f"{result['requests']:,} requests over {args.connections} connections in {result['seconds']:.2f} s: "
+          f"{result['per_second']:,.0f} requests/s, p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+    print("statuses: " + ", ".join(f"{status}: {count:,}" for status, count in sorted(result["statuses"].items())))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,112 @@
+"""Logging setup: records are handed to a background thread that formats them as JSON lines and writes
+them to a size-rotated log file.
+
+The thread posting a transaction only creates the log record and puts it on a queue. Messages
+are %-style templates with their arguments, so the message is only built by the background thread,
+and not at all for records below the level. Postings, month end and the other events pass their
+fields with extra={"event": ..., ...}, and each field becomes a key of the JSON line, so the log can be
+filtered by event, account or month without parsing messages. Call configure() once at startup.
+
+Environment:
+    BANK_LOG_LEVEL      DEBUG (default), INFO, WARNING, ERROR or CRITICAL
+    BANK_LOG_FORMAT     json (default), or text for the old timestamp|level|message lines
+    BANK_LOG_MAX_BYTES  size at which the log file is rotated, 10 MB by default
+    BANK_LOG_BACKUPS    number of rotated files kept, 5 by default
+"""
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+TEXT_FORMAT = '%(asctime)s|%(levelname)s|%(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# attributes every LogRecord has; anything else on a record was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON object: time, level, logger, message, any extra fields and the traceback"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Puts records on the queue as they are, leaving the message to be formatted by the listener.
+
+    The standard QueueHandler formats every record in the logging thread so it can be pickled;
+    this queue never leaves the process, and log arguments are not modified after logging.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def configure(filename='bank.log', level=None, log_format=None, max_bytes=None, backups=None):
+    """Routes the root logger through a queue to a rotating file written by a background thread.
+
+    Arguments left out are read from the environment. Calling it again replaces the previous setup.
+
+    Returns:
+        QueueListener: the background writer, stopped automatically at exit
+    """
+    global _listener
+    level = level or os.environ.get("BANK_LOG_LEVEL", "DEBUG")
+    log_format = log_format or os.environ.get("BANK_LOG_FORMAT", "json")
+    max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("BANK_LOG_MAX_BYTES", DEFAULT_MAX_BYTES))
+    backups = backups if backups is not None else int(os.environ.get("BANK_LOG_BACKUPS", DEFAULT_BACKUPS))
+
+    file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups)
+    if log_format == "text":
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    else:
+        file_handler.setFormatter(JSONFormatter())
+
+    stop()
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(records))
+    set_level(level)
+
+    _listener = logging.handlers.QueueListener(records, file_handler)
+    _listener.start()
+    return _listener
+
+
+def set_level(level):
+    """Changes the level of the root logger, e.g. to INFO to stop writing the per-posting DEBUG records"""
+    logging.getLogger().setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def stop():
+    """Writes out the queued records and stops the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop)
@@ -0,0 +1,122 @@
+"""Upgrades a bank database to the current schema in place.
+
+    python migrate.py [bank.db]
+
+The schema version is kept in SQLite's user_version. Version 0 is the original schema, with
+dollar amounts stored as floats and transactions pointing at their account through a
+column named _account_number. Version 1 stores every amount as integer cents, names that
+column _account_id and indexes transactions by (account, date) and accounts by
+(bank, account number). Version 2 adds each bank's account number sequence. Version 3 adds
+the per-account monthly totals that statements are served from, filled from the transactions.
+"""
+import sys
+import logging
+import logconfig
+
+import sqlalchemy
+from sqlalchemy.pool import NullPool
+
+from transactions import Base, create_indexes
+from db import create_engine
+import bank  # noqa: F401 (registers the bank and account tables on Base)
+from statements import REBUILD_MONTHS
+
+SCHEMA_VERSION = 3
+
+# each step runs inside the migration's transaction; None creates any missing tables of the current schema
+MIGRATE_0_TO_1 = [
+    'DROP INDEX IF EXISTS ix_transaction_account_date_exempt',
+    'ALTER TABLE "transaction" RENAME TO transaction_v0',
+    'ALTER TABLE account RENAME TO account_v0',
+    None,  # create the version 1 tables
+    """INSERT INTO account (_id, _account_number, _type, _balance_cents, _interest_rate, _bank_id,
+                            _daily_limit, _monthly_limit, _balance_threshold_cents, _low_balance_fee_cents)
+       SELECT _id, _account_number, _type, CAST(ROUND(_balance * 100) AS INTEGER), _interest_rate, _bank_id,
+              _daily_limit, _monthly_limit, CAST(ROUND(_balance_threshold * 100) AS INTEGER),
+              CAST(ROUND(_low_balance_fee * 100) AS INTEGER)
+       FROM account_v0""",
+    """INSERT INTO "transaction" (_id, _amt_cents, _account_id, _date, _exempt)
+       SELECT _id, CAST(ROUND(_amt * 100) AS INTEGER), _account_number, _date, COALESCE(_exempt, 0)
+       FROM transaction_v0""",
+    # running totals are recomputed from the rounded ledger so the two agree to the cent
+    """UPDATE account SET _balance_cents = COALESCE(
+           (SELECT SUM(_amt_cents) FROM "transaction" WHERE _account_id = account._id), 0)""",
+    'DROP TABLE transaction_v0',
+    'DROP TABLE account_v0',
+]
+
+MIGRATE_1_TO_2 = [
+    'ALTER TABLE bank ADD COLUMN _next_account_number INTEGER NOT NULL DEFAULT 1',
+    """UPDATE bank SET _next_account_number = COALESCE(
+           (SELECT MAX(_account_number) FROM account WHERE _bank_id = bank._id), 0) + 1""",
+]
+
+MIGRATE_2_TO_3 = [
+    None,  # create the account_month table
+    *REBUILD_MONTHS,
+]
+
+# steps that upgrade a database from the version they are keyed by to the next one
+MIGRATIONS = {0: MIGRATE_0_TO_1, 1: MIGRATE_1_TO_2, 2: MIGRATE_2_TO_3}
+
+
+def schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _migration_engine(url):
+    """Engine whose transactions are started with an explicit BEGIN, so DDL is rolled back with the data"""
+    engine = sqlalchemy.create_engine(url, poolclass=NullPool)
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @sqlalchemy.event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+def upgrade(engine):
+    """Brings the database behind engine to SCHEMA_VERSION, creating it if it is empty.
+
+    Returns:
+        int: the schema version the database had before the upgrade
+    """
+    with engine.connect() as connection:
+        version = schema_version(connection)
+        tables = sqlalchemy.inspect(connection).get_table_names()
+
+    if not tables:
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    elif version < SCHEMA_VERSION:
+        migration_engine = _migration_engine(engine.url)
+        try:
+            with migration_engine.begin() as connection:
+                for from_version in range(version, SCHEMA_VERSION):
+                    for step in MIGRATIONS[from_version]:
+                        if step is None:
+                            Base.metadata.create_all(connection)
+                        else:
+                            connection.exec_driver_sql(step)
+                connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        finally:
+            migration_engine.dispose()
+        logging.debug("Upgraded %s from schema version %s to %s", engine.url.database, version, SCHEMA_VERSION)
+    else:
+        Base.metadata.create_all(engine)
+    create_indexes(engine)
+    return version
+
+
+if __name__ == "__main__":
+    logconfig.configure('bank.log')
+    engine = create_engine(sys.argv[1] if len(sys.argv) > 1 else None)
+    before = upgrade(engine)
+    with engine.connect() as connection:
+        after = schema_version(connection)
+    print(f"{engine.url.database}: schema version {before} -> {after}")
@@ -0,0 +1,161 @@
+import re
+import decimal
+from functools import lru_cache
+
+# a plain dollar amount with at most two decimals, parsed without Decimal
+_AMOUNT = re.compile(r"\s*([+-]?)(\d*)(?:\.(\d{0,2}))?\s*")
+# used only to round amounts with more than two decimals, independently of the thread's decimal context
+_CONTEXT = decimal.Context(prec=50, rounding=decimal.ROUND_HALF_UP)
+
+
+def _round_cents(value):
+    "Rounds a finite Decimal dollar amount half up to integer cents"
+    if not value.is_finite():
+        raise ValueError(f"invalid amount {value}")
+    return int(value.scaleb(2, _CONTEXT).quantize(1, context=_CONTEXT))
+
+
+@lru_cache(maxsize=64)
+def rate_ratio(rate):
+    """Returns an interest rate (a Decimal, float, text or int) as the exact (numerator, denominator) pair
+    that Money.times_ratio takes. Rates that do not change, like an account type's, are converted once."""
+    return decimal.Decimal(repr(rate) if isinstance(rate, float) else rate).as_integer_ratio()
+
+
+class Money:
+    """An amount of money held as integer cents.
+
+    Amounts are rounded half up to cents once, when they are made from text, a float or a Decimal;
+    all arithmetic after that is exact integer arithmetic and does not depend on the decimal context.
+    Interest is computed with times_ratio (or times_rate), which rounds half up to cents as well.
+    """
+    __slots__ = ("cents",)
+
+    def __init__(self, cents=0):
+        self.cents = cents
+
+    @classmethod
+    def of(cls, amount):
+        "Makes Money from Money, whole dollars as an int, or a dollar amount as text, a float or a Decimal"
+        if type(amount) is cls:
+            return amount
+        if isinstance(amount, bool):
+            raise TypeError(f"invalid amount {amount!r}")
+        if isinstance(amount, int):
+            return cls(amount * 100)
+        if isinstance(amount, float):
+            # the shortest repr, so 0.1 is ten cents and not 0.1000000000000000055...
+            return cls.parse(repr(amount))
+        if isinstance(amount, str):
+            return cls.parse(amount)
+        return cls(_round_cents(decimal.Decimal(amount)))
+
+    @classmethod
+    def parse(cls, text):
+        "Makes Money from a dollar amount written as text, e.g. '-12.34'. Raises ValueError if it is not one"
+        match = _AMOUNT.fullmatch(text)
+        if match is not None and (match.group(2) or match.group(3)):
+            sign, dollars, cents = match.groups()
+            value = int(dollars or 0) * 100 + int((cents or "").ljust(2, "0"))
+            return cls(-value if sign == "-" else value)
+        try:
+            return cls(_round_cents(decimal.Decimal(text.strip())))
+        except decimal.InvalidOperation:
+            raise ValueError(f"invalid amount {text!r}")
+
+    def times_ratio(self, ratio):
+        "Returns this amount times a rate given as rate_ratio returns it, rounded half up to cents"
+        numerator, denominator = ratio
+        product = 2 * self.cents * numerator
+        if product < 0:
+            return Money(-((denominator - product) // (2 * denominator)))
+        return Money((product + denominator) // (2 * denominator))
+
+    def times_rate(self, rate):
+        "Returns this amount times an interest rate (a Decimal, text or int), rounded half up to cents"
+        return self.times_ratio(rate_ratio(rate))
+
+    def to_decimal(self):
+        return decimal.Decimal(self.cents).scaleb(-2)
+
+    def __add__(self, other):
+        if type(other) is Money:
+            return Money(self.cents + other.cents)
+        if other == 0:
+            return self  # the start value of sum()
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if type(other) is Money:
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return Money(self.cents * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def _compared(self, other):
+        "Returns the cents of what a Money is compared with: Money, whole dollars or a Decimal amount"
+        if type(other) is Money:
+            return other.cents
+        if isinstance(other, bool):
+            return None
+        if isinstance(other, int):
+            return other * 100
+        if isinstance(other, (float, decimal.Decimal)):
+            return Money.of(other).cents
+        return None
+
+    def __eq__(self, other):
+        cents = self._compared(other)
+        return NotImplemented if cents is None else self.cents == cents
+
+    def __lt__(self, other):
+        cents = self._compared(other)
+        return NotImplemented if cents is None else self.cents < cents
+
+    def __le__(self, other):
+        cents = self._compared(other)
+        return NotImplemented if cents is None else self.cents <= cents
+
+    def __gt__(self, other):
+        cents = self._compared(other)
+        return NotImplemented if cents is None else self.cents > cents
+
+    def __ge__(self, other):
+        cents = self._compared(other)
+        return NotImplemented if cents is None else self.cents >= cents
+
+    def __hash__(self):
+        # equal to the hash of an equal int or Decimal
+        return hash(self.to_decimal())
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __str__(self):
+        dollars, cents = divmod(abs(self.cents), 100)
+        return f"{'-' if self.cents < 0 else ''}{dollars}.{cents:02d}"
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
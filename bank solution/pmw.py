@@ -1,46 +1,108 @@
 import tkinter as tk
 from tkinter import font
+from collections import OrderedDict
 
 class ListBox(tk.Frame):
     """
     A megawidget for displaying transactions using a Listbox.
     The transaction amount color is blue for positive values and red for negative values.
+
+    Only the rows that fit in the Listbox are rendered. Transactions are fetched from the database
+    a page at a time as they scroll into view, and the most recently used pages are kept, so an
+    account with any number of transactions lists as quickly as one with a few.
     """
-    
-    def __init__(self, parent, transaction_list, **kwargs):
+    PAGE_SIZE = 100
+    CACHED_PAGES = 8
+    WHEEL_ROWS = 3  # rows scrolled per mouse wheel step
+
+    def __init__(self, parent, height=10, **kwargs):
         super().__init__(parent, **kwargs)
-        self._transaction_list = transaction_list
-        self._labels = []
+        self._height = height
+        self._count = 0
+        self._fetch = None
+        self._top = 0  # index of the first visible row
+        self._pages = OrderedDict()
 
-        
-        self.scrollbar = tk.Scrollbar(parent)
+        self.scrollbar = tk.Scrollbar(self, command=self._yview)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        
         self.listbox = tk.Listbox(
-            parent,
+            self,
             width=40,
-            height=10,
+            height=height,
             relief=tk.SUNKEN,
             bg="#F5F5F5",
-            font=font.Font(size=12),
-            yscrollcommand=self.scrollbar.set
+            font=font.Font(size=12)
         )
+        # the Listbox only ever holds the visible rows, so scrolling is handled here
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(sequence, self._wheel)
+
+        self.listbox.pack(padx=5, pady=5)
+        self.pack()
+        self._render()
+
+    def show(self, count, fetch):
+        """Lists a new set of transactions from the top
 
-        for t in self._transaction_list:
-            color = 'blue' if t._amt >= 0 else 'red'
-            self.listbox.insert(tk.END, str(t))
+        Args:
+            count (int): number of transactions
+            fetch (callable): fetch(offset, limit) returns up to limit transactions from offset, in order
+        """
+        self._count = count
+        self._fetch = fetch
+        self._top = 0
+        self._pages.clear()
+        self._render()
+
+    def _row(self, index):
+        "Returns the text and color of row index, fetching its page if it is not cached"
+        number, offset = divmod(index, self.PAGE_SIZE)
+        page = self._pages.get(number)
+        if page is None:
+            page = [(str(t), 'blue' if t._amt >= 0 else 'red')
+                    for t in self._fetch(number * self.PAGE_SIZE, self.PAGE_SIZE)]
+            self._pages[number] = page
+            if len(self._pages) > self.CACHED_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(number)
+        return page[offset] if offset < len(page) else None
+
+    def _render(self):
+        "Replaces the rows in the Listbox with the visible ones and moves the scrollbar to match"
+        self.listbox.delete(0, tk.END)
+        for index in range(self._top, min(self._top + self._height, self._count)):
+            row = self._row(index)
+            if row is None:
+                break  # fewer transactions than counted
+            text, color = row
+            self.listbox.insert(tk.END, text)
             self.listbox.itemconfig(tk.END, {'fg': color})
+        if self._count:
+            self.scrollbar.set(self._top / self._count, (self._top + self.listbox.size()) / self._count)
+        else:
+            self.scrollbar.set(0, 1)
 
-        self.scrollbar.config(command=self.listbox.yview)
-        
-        self._labels.append(self.listbox)
+    def _scroll_to(self, top):
+        top = max(0, min(top, self._count - self._height))
+        if top != self._top:
+            self._top = top
+            self._render()
 
-        self.listbox.pack(padx=5, pady=5)
+    def _yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) when dragged, ('scroll', n, 'units' or 'pages') when clicked"""
+        if args[0] == "moveto":
+            self._scroll_to(round(float(args[1]) * self._count))
+        elif args[0] == "scroll":
+            rows = int(args[1]) * (self._height if args[2] == "pages" else 1)
+            self._scroll_to(self._top + rows)
 
+    def _wheel(self, event):
+        up = event.num == 4 or event.delta > 0
+        self._scroll_to(self._top + (-self.WHEEL_ROWS if up else self.WHEEL_ROWS))
+        return "break"
 
     def destroyer(self):
         """Method to destroy the megawidget"""
-        for x in self._labels:
-            x.destroy()
-
+        self.destroy()
@@ -0,0 +1,396 @@
+"""Local HTTP/JSON service for the bank, serving many clients at once from one asyncio event loop.
+
+    python service.py [--host 127.0.0.1] [--port 8080]
+
+    POST /accounts                               {"type": "checking"}    open an account
+    GET  /accounts?offset=0&limit=100                                    summary of accounts
+    GET  /accounts/<number>?as_of=2024-01-31                             one account, balance as of a date
+    POST /accounts/<number>/transactions         {"amount": "10.00", "date": "2024-01-31"}
+    GET  /accounts/<number>/transactions?start=&end=&offset=&limit=      list transactions
+    GET  /accounts/<number>/statements?start=2024-01&end=2024-12         monthly statements
+    POST /accounts/<number>/interest-and-fees                            interest and fees for one account
+    POST /month-end                              {"month": "2024-01"}    interest and fees for every account
+
+The SQLAlchemy session is not thread safe and SQLite takes one writer at a time, so all database
+work runs on a single executor thread, the way an async SQLite driver runs its connection.
+Requests reach that thread through one queue and run in the order they arrived, which keeps each
+account consistent however many requests for it are in flight. Everything waiting in the queue is
+handed over in one executor call, and postings waiting together are checked and written as one
+batch with Bank.add_transactions and committed once.
+"""
+import re
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import logconfig
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+from bank import Bank, SAVINGS, CHECKING
+from exceptions import OverdrawError, TransactionLimitError, TransactionSequenceError
+from migrate import upgrade
+from db import create_engine
+from money import Money
+
+MAX_BATCH = 1000  # queued requests handed to the database thread together at most
+MAX_BODY = 65536
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    "Ends a request with an error status and message"
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _rejection(exception):
+    "Turns an exception raised by a posting into the HTTPError to answer with"
+    if isinstance(exception, OverdrawError):
+        return HTTPError(409, "This transaction could not be completed due to an insufficient account balance.")
+    if isinstance(exception, TransactionLimitError):
+        return HTTPError(409, f"This transaction could not be completed because this account already has "
+                              f"{exception.limit} transactions in this {exception.limit_type}.")
+    if isinstance(exception, TransactionSequenceError):
+        return HTTPError(409, f"New transactions must be from {exception.latest_date} onward.")
+    if isinstance(exception, ValueError):
+        return HTTPError(404, str(exception))
+    return exception
+
+
+def _account_json(account):
+    return {"number": account._account_number, "type": account._type, "balance": str(account.get_balance())}
+
+
+def _int(query, name, default=None):
+    try:
+        return int(query[name]) if name in query else default
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+
+
+def _date(text, name="date"):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be a date in the format YYYY-MM-DD")
+
+
+class BankService:
+    """Serves one bank database over HTTP/JSON"""
+
+    def __init__(self, engine):
+        self._Session = sessionmaker(bind=engine)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bank-db")
+        self._session = None
+        self._bank = None
+        self._queue = None
+        self._routes = [
+            ("POST", re.compile(r"/accounts"), self._open_account),
+            ("GET", re.compile(r"/accounts"), self._summary),
+            ("GET", re.compile(r"/accounts/(\d+)"), self._get_account),
+            ("POST", re.compile(r"/accounts/(\d+)/transactions"), self._add_transaction),
+            ("GET", re.compile(r"/accounts/(\d+)/transactions"), self._list_transactions),
+            ("GET", re.compile(r"/accounts/(\d+)/statements"), self._statements),
+            ("POST", re.compile(r"/accounts/(\d+)/interest-and-fees"), self._interest_and_fees),
+            ("POST", re.compile(r"/month-end"), self._month_end),
+        ]
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        """Opens the bank and serves requests until cancelled"""
+        await self._run(self._load)
+        self._queue = asyncio.Queue()
+        worker = asyncio.create_task(self._database_loop())
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        logging.debug("Serving on %s:%s", host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+            await self._run(self._session.close)
+            self._executor.shutdown()
+
+    def _run(self, function, *args):
+        "Runs function on the database thread"
+        return asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _load(self):
+        self._session = self._Session()
+        self._bank = self._session.query(Bank).first()
+        if not self._bank:
+            self._bank = Bank()
+            self._session.add(self._bank)
+            self._session.commit()
+
+    # database thread
+
+    async def _submit(self, kind, argument):
+        """Queues work for the database thread and waits for its result.
+
+        kind is "read" or "write" with a function to call, or "post" with an
+        (account number, amount, date) posting.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((kind, argument, future))
+        return await future
+
+    def _read(self, function):
+        return self._submit("read", function)
+
+    def _write(self, function):
+        return self._submit("write", function)
+
+    async def _database_loop(self):
+        while True:
+            work = [await self._queue.get()]
+            while not self._queue.empty() and len(work) < MAX_BATCH:
+                work.append(self._queue.get_nowait())
+            try:
+                results = await self._run(self._apply, work)
+            except Exception as e:
+                # fail this batch rather than the loop, which would leave every later request waiting
+                logging.error("%s: %r", e.__class__.__name__, e)
+                results = [e] * len(work)
+            for (_, _, future), result in zip(work, results):
+                if future.done():
+                    continue  # the client went away
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _apply(self, work):
+        """Runs queued work in order on the database thread.
+
+        Postings are checked and written as one batch up to the next other change, which is
+        committed on its own. Reads do not end a batch: no request in the queue has been answered
+        yet, so a read may see the state before postings queued alongside it.
+
+        Returns:
+            list: the result or exception of each item, in the order given
+        """
+        results = [None] * len(work)
+        postings = []  # (index, posting)
+
+        def apply_postings():
+            for (i, _), result in zip(postings, self._apply_postings([p for _, p in postings])):
+                results[i] = result
+            postings.clear()
+
+        for i, (kind, argument, future) in enumerate(work):
+            if kind == "post":
+                postings.append((i, argument))
+                continue
+            if kind == "write":
+                apply_postings()
+            try:
+                results[i] = argument()
+                if kind == "write":
+                    self._session.commit()
+            except Exception as e:
+                if kind == "write":
+                    self._session.rollback()
+                results[i] = e
+        apply_postings()
+        return results
+
+    def _apply_postings(self, postings):
+        if not postings:
+            return []
+        try:
+            rejected = self._bank.add_transactions(postings, self._session)
+            self._session.commit()
+        except Exception as e:
+            self._session.rollback()
+            logging.error("%s: %r", e.__class__.__name__, e)
+            return [e] * len(postings)
+        errors = dict(rejected)
+        return [_rejection(errors[i]) if i in errors else None for i in range(len(postings))]
+
+    # requests
+
+    async def _open_account(self, query, body):
+        acct_type = body.get("type")
+        if acct_type not in (SAVINGS, CHECKING):
+            raise HTTPError(400, f"type must be {SAVINGS} or {CHECKING}")
+
+        def open_account():
+            return _account_json(self._bank.add_accounts(acct_type, 1, self._session)[0])
+        return 201, await self._write(open_account)
+
+    async def _summary(self, query, body):
+        offset, limit = _int(query, "offset", 0), _int(query, "limit")
+        return 200, await self._read(lambda: [_account_json(a) for a in self._bank.show_accounts(offset, limit)])
+
+    def _find_account(self, number):
+        account = self._bank.get_account(number)
+        if account is None:
+            raise HTTPError(404, f"no account #{number:09}")
+        return account
+
+    async def _get_account(self, query, body, number):
+        as_of = _date(query["as_of"], "as_of") if "as_of" in query else None
+
+        def get_account():
+            account = self._find_account(int(number))
+            result = _account_json(account)
+            if as_of is not None:
+                result["as_of"] = str(as_of)
+                result["balance"] = str(account.balance_as_of(as_of))
+            return result
+        return 200, await self._read(get_account)
+
+    async def _add_transaction(self, query, body, number):
+        try:
+            amount = Money.parse(str(body["amount"]))
+        except (KeyError, ValueError):
+            raise HTTPError(400, "amount must be a valid dollar amount")
+        date = _date(body.get("date"))
+        error = await self._submit("post", (int(number), amount, date))
+        if error is not None:
+            raise error
+        return 201, {"number": int(number), "amount": str(amount), "date": str(date)}
+
+    async def _list_transactions(self, query, body, number):
+        start = _date(query["start"], "start") if "start" in query else None
+        end = _date(query["end"], "end") if "end" in query else None
+        offset, limit = _int(query, "offset", 0), _int(query, "limit")
+
+        def list_transactions():
+            account = self._find_account(int(number))
+            return [{"date": str(t.date), "amount": str(t._amt), "exempt": t.is_exempt()}
+                    for t in account.iter_transactions(start, end, offset, limit)]
+        return 200, await self._read(list_transactions)
+
+    async def _statements(self, query, body, number):
+        try:
+            start = datetime.strptime(query["start"], "%Y-%m").date()
+            end = datetime.strptime(query["end"], "%Y-%m").date() if "end" in query else start
+        except (KeyError, ValueError):
+            raise HTTPError(400, "start and end must be months in the format YYYY-MM")
+
+        def statements():
+            account = self._find_account(int(number))
+            return [{"month": f"{s.month:%Y-%m}", "opening": str(s.opening), "deposits": str(s.deposits),
+                     "withdrawals": str(s.withdrawals), "interest": str(s.interest), "fees": str(s.fees),
+                     "closing": str(s.closing), "count": s.count}
+                    for s in account.get_statements(start, end)]
+        return 200, await self._read(statements)
+
+    async def _interest_and_fees(self, query, body, number):
+        def interest_and_fees():
+            account = self._find_account(int(number))
+            try:
+                account.assess_interest_and_fees(self._session)
+            except TransactionSequenceError as e:
+                raise HTTPError(409, f"Cannot apply interest and fees again in the month of "
+                                     f"{e.latest_date.strftime('%B')}.")
+            except ValueError as e:
+                raise HTTPError(409, str(e))
+            return _account_json(account)
+        return 200, await self._write(interest_and_fees)
+
+    async def _month_end(self, query, body):
+        try:
+            closing = datetime.strptime(body.get("month"), "%Y-%m")
+        except (TypeError, ValueError):
+            raise HTTPError(400, "month must be in the format YYYY-MM")
+
+        def month_end():
+            result = self._bank.run_month_end(self._session, closing.year, closing.month)
+            return {key: str(value) if isinstance(value, Money) else value for key, value in result.items()}
+        return 200, await self._write(month_end)
+
+    # HTTP
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.fullmatch(url.path.rstrip("/") or "/")
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            try:
+                payload = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(400, "body must be JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            return await handler(dict(parse_qsl(url.query)), payload, *match.groups())
+        if allowed:
+            raise HTTPError(405, f"{method} is not allowed on {url.path}")
+        raise HTTPError(404, f"no such resource {url.path}")
+
+    async def _handle_connection(self, reader, writer):
+        """Answers the requests of one keep-alive connection in order"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                try:
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HTTPError(413, "request body too large")
+                    body = await reader.readexactly(length)
+                    status, payload = await self._dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    logging.error("%s: %r", e.__class__.__name__, e)
+                    status, payload = 500, {"error": "Sorry! Something unexpected happened."}
+
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client disconnected or sent something that is not HTTP
+        finally:
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the bank over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(argv)
+
+    engine = create_engine()
+    upgrade(engine)
+    try:
+        asyncio.run(BankService(engine).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    logconfig.configure('bank.log')
+    main(sys.argv[1:])
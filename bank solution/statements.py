@@ -0,0 +1,167 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, text
+from datetime import date
+import logging
+
+from transactions import Base, from_cents
+
+# Adds one (account, month) delta to the monthly totals. A new month starts at the opening balance
+# of the delta; postings are only accepted on or after an account's latest date, so a delta for an
+# existing month always follows on from its closing balance and only moves it forward.
+RECORD_MONTH = """
+    INSERT INTO account_month (_account_id, _month, _opening_cents, _closing_cents, _deposits_cents,
+                               _withdrawals_cents, _interest_cents, _fees_cents, _count)
+    VALUES (:account_id, :month, :opening, :closing, :deposits, :withdrawals, :interest, :fees, :count)
+    ON CONFLICT (_account_id, _month) DO UPDATE SET
+        _closing_cents = excluded._closing_cents,
+        _deposits_cents = _deposits_cents + excluded._deposits_cents,
+        _withdrawals_cents = _withdrawals_cents + excluded._withdrawals_cents,
+        _interest_cents = _interest_cents + excluded._interest_cents,
+        _fees_cents = _fees_cents + excluded._fees_cents,
+        _count = _count + excluded._count"""
+
+# Recomputes the monthly totals of every account from its transactions, e.g. to fill the table
+# when it is first created. Closing balances are running sums of the monthly net amounts.
+REBUILD_MONTHS = [
+    "DELETE FROM account_month",
+    """INSERT INTO account_month (_account_id, _month, _opening_cents, _closing_cents, _deposits_cents,
+                                  _withdrawals_cents, _interest_cents, _fees_cents, _count)
+       SELECT account_id, month, closing - net, closing, deposits, withdrawals, interest, fees, count
+       FROM (SELECT *, SUM(net) OVER (PARTITION BY account_id ORDER BY month) AS closing
+             FROM (SELECT _account_id AS account_id, strftime('%Y-%m-01', _date) AS month,
+                          SUM(_amt_cents) AS net,
+                          SUM(CASE WHEN NOT _exempt AND _amt_cents >= 0 THEN _amt_cents ELSE 0 END) AS deposits,
+                          SUM(CASE WHEN NOT _exempt AND _amt_cents < 0 THEN _amt_cents ELSE 0 END) AS withdrawals,
+                          SUM(CASE WHEN _exempt AND _amt_cents >= 0 THEN _amt_cents ELSE 0 END) AS interest,
+                          SUM(CASE WHEN _exempt AND _amt_cents < 0 THEN _amt_cents ELSE 0 END) AS fees,
+                          COUNT(*) AS count
+                   FROM "transaction" GROUP BY _account_id, month))""",
+]
+
+
+def month_start(day):
+    "Returns the first day of the month of day"
+    return day.replace(day=1)
+
+
+def next_month(month):
+    "Returns the first day of the month after month"
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+class MonthlyStatement(Base):
+    """Totals of one account's transactions in one calendar month, kept up to date as they are posted.
+
+    Amounts are integer cents. Withdrawals and fees are negative, like the transactions they add up,
+    so the closing balance is the opening balance plus the four totals.
+    """
+    __tablename__ = 'account_month'
+
+    _account_id = Column(Integer, ForeignKey('account._id'), primary_key=True)
+    _month = Column(Date, primary_key=True)  # first day of the month
+    _opening_cents = Column(Integer, nullable=False, default=0)
+    _closing_cents = Column(Integer, nullable=False, default=0)
+    _deposits_cents = Column(Integer, nullable=False, default=0)
+    _withdrawals_cents = Column(Integer, nullable=False, default=0)
+    _interest_cents = Column(Integer, nullable=False, default=0)
+    _fees_cents = Column(Integer, nullable=False, default=0)
+    _count = Column(Integer, nullable=False, default=0)
+
+    def __init__(self, account_id, month, balance_cents=0):
+        """Creates the statement of a month without transactions
+
+        Args:
+            account_id (int): id of the account
+            month (Date): first day of the month
+            balance_cents (int, optional): balance carried through the month. Defaults to 0.
+        """
+        self._account_id = account_id
+        self._month = month
+        self._opening_cents = self._closing_cents = balance_cents
+        self._deposits_cents = self._withdrawals_cents = 0
+        self._interest_cents = self._fees_cents = 0
+        self._count = 0
+
+    @property
+    def month(self):
+        return self._month
+
+    @property
+    def opening(self):
+        return from_cents(self._opening_cents)
+
+    @property
+    def closing(self):
+        return from_cents(self._closing_cents)
+
+    @property
+    def deposits(self):
+        return from_cents(self._deposits_cents)
+
+    @property
+    def withdrawals(self):
+        return from_cents(self._withdrawals_cents)
+
+    @property
+    def interest(self):
+        return from_cents(self._interest_cents)
+
+    @property
+    def fees(self):
+        return from_cents(self._fees_cents)
+
+    @property
+    def count(self):
+        return self._count
+
+    def __str__(self):
+        """Formats the month and its totals.
+        For example, '2024-03, opening: $50.00, deposits: $20.00, withdrawals: -$5.00, interest: $0.04, fees: $0.00, closing: $65.04, 3 transactions'
+        """
+        def dollars(amount):
+            return f"-${-amount:,.2f}" if amount < 0 else f"${amount:,.2f}"
+        return (f"{self._month:%Y-%m}, opening: {dollars(self.opening)}, deposits: {dollars(self.deposits)}, "
+                f"withdrawals: {dollars(self.withdrawals)}, interest: {dollars(self.interest)}, "
+                f"fees: {dollars(self.fees)}, closing: {dollars(self.closing)}, {self._count} transactions")
+
+
+def month_deltas(account_id, opening_cents, rows):
+    """Adds up transaction rows of one account into a RECORD_MONTH parameter set per month
+
+    Args:
+        account_id (int): id of the account
+        opening_cents (int): balance before the first row
+        rows (iterable): transaction rows in posting order, as passed to a Transaction bulk insert
+
+    Returns:
+        list: parameters for RECORD_MONTH, one dict per month
+    """
+    deltas = {}
+    balance = opening_cents
+    for row in rows:
+        month = month_start(row["_date"]).isoformat()
+        delta = deltas.get(month)
+        if delta is None:
+            delta = deltas[month] = {"account_id": account_id, "month": month, "opening": balance,
+                                     "deposits": 0, "withdrawals": 0, "interest": 0, "fees": 0, "count": 0}
+        cents = row["_amt_cents"]
+        if row["_exempt"]:
+            delta["interest" if cents >= 0 else "fees"] += cents
+        else:
+            delta["deposits" if cents >= 0 else "withdrawals"] += cents
+        delta["count"] += 1
+        balance += cents
+        delta["closing"] = balance
+    return list(deltas.values())
+
+
+def record_months(session, deltas):
+    "Adds the month deltas built by month_deltas to the monthly totals, in the session's transaction"
+    if deltas:
+        session.execute(text(RECORD_MONTH), deltas)
+
+
+def rebuild_months(session):
+    "Recomputes every account's monthly totals from its transactions. Nothing is committed."
+    for statement in REBUILD_MONTHS:
+        session.execute(text(statement))
+    logging.debug("Rebuilt monthly statements")
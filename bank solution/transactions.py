@@ -1,24 +1,49 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, date, timedelta
 import logging
 
+from money import Money
+
 Base = declarative_base()
 
+
+def to_cents(amount):
+    "Converts a dollar amount (Money, int, float, Decimal or text) to integer cents, rounding half up"
+    return Money.of(amount).cents
+
+
+def from_cents(cents):
+    "Converts integer cents to Money"
+    return Money(cents)
+
+
+def last_day_of_month(year, month):
+    "Returns the date of the last day of the given month"
+    # Creates a date on the first of the next month (being careful about
+    # wrapping around to January), then subtracts one day
+    return date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+
 class Transaction(Base):
     __tablename__ = 'transaction'
 
     _id = Column(Integer, primary_key=True)
-    _amt = Column(Numeric, nullable=False)
-    _account_number = Column(Integer, ForeignKey('account._id'))
+    _amt_cents = Column(Integer, nullable=False)
+    _account_id = Column(Integer, ForeignKey('account._id'), nullable=False)
     _date = Column(Date, nullable=False)
-    _exempt = Column(Boolean, default=False)
+    _exempt = Column(Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        # serves the sequence check, savings limit counts and once-per-month interest check
+        Index("ix_transaction_account_date_exempt", "_account_id", "_date", "_exempt"),
+    )
 
     def __init__(self, amt, acct_num, date, exempt=False):
         """
         Args:
-            amt (Decimal): Decimal object representing dollar amount of the transaction.
+            amt (Money): dollar amount of the transaction. Other amounts are rounded half up to cents.
             acct_num (int): Account number used for logging the transaction's creation.
             date (Date): Date object representing the date the transaction was created.
             exempt (bool, optional): Determines whether the transaction is exempt from account limits. Defaults to False.
@@ -26,7 +51,18 @@ class Transaction(Base):
         self._amt = amt
         self._date = date
         self._exempt = exempt
-        logging.debug(f"Created transaction: {acct_num}, {self._amt}")
+        amount = self._amt
+        logging.debug("Created transaction: %s, %s", acct_num, amount, extra={
+            "event": "posting", "account_number": acct_num, "amount": amount, "date": date, "exempt": exempt})
+
+    @property
+    def _amt(self):
+        "Amount as Money, stored as integer cents"
+        return from_cents(self._amt_cents)
+
+    @_amt.setter
+    def _amt(self, amt):
+        self._amt_cents = to_cents(amt)
 
     @property
     def date(self):
@@ -78,11 +114,11 @@ class Transaction(Base):
 
     def last_day_of_month(self):
         "Returns a date corresponding to the last day in the same month as this transaction"
+        return last_day_of_month(self._date.year, self._date.month)
 
-        # Creates a date on the first of the next month (being careful about
-        # wrapping around to January)
-        first_of_next_month = date(self._date.year + self._date.month // 12,
-                                   self._date.month % 12 + 1, 1)
-        # Then subtracts one day
-        return first_of_next_month - timedelta(days=1)
 
+def create_indexes(engine):
+    "Adds the indexes declared on the models to tables that were created before they existed"
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
@@ -0,0 +1,42 @@
+"""Runs the benchmarks of both engines with the same arguments and merges their JSON results.
+
+    python run_benchmarks.py --transactions 1000 100000 --accounts 100 10000 --json results.json
+    python run_benchmarks.py --baseline results.json
+
+Each engine runs in its own process from its own directory, since both use the same module names.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ["BankAPP", "bank solution"]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark both bank engines")
+    parser.add_argument("--json", help="write the merged results to this file")
+    parser.add_argument("--baseline", help="compare throughput against merged results saved by an earlier run")
+    args, engine_args = parser.parse_known_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for engine in ENGINES:
+            output = os.path.join(directory, "results.json")
+            command = [sys.executable, "benchmark.py", *engine_args, "--json", output]
+            if args.baseline:
+                command += ["--baseline", os.path.abspath(args.baseline)]
+            subprocess.run(command, cwd=os.path.join(ROOT, engine), check=True)
+            with open(output) as f:
+                results.update(json.load(f))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])